@@ -0,0 +1,60 @@
+"""
+Measures how a CPU bound service scales when its methods run in worker processes
+through pyoc.ProcessWrapper.
+
+    python -m bench.process_scaling [tasks] [task size]
+"""
+import os
+import sys
+import time
+import pyoc
+
+
+class PrimeService:
+    def count_primes(self, start, end):
+        count = 0
+        for n in range(max(start, 2), end):
+            if all(n % d for d in range(2, int(n ** 0.5) + 1)):
+                count += 1
+        return count
+
+
+def build_context():
+    return pyoc.Context().add(PrimeService).wrap(PrimeService, "count_primes", pyoc.ProcessWrapper).build()
+
+
+def run(context, workers, ranges):
+    context.set_process_pool(build_context, max_workers=workers)
+    dispatcher = context.process_dispatcher
+    # Start the workers before measuring.
+    list(dispatcher.map(PrimeService, "count_primes", [0] * workers, [1] * workers))
+
+    start = time.perf_counter()
+    result = sum(dispatcher.map(PrimeService, "count_primes", *zip(*ranges)))
+    elapsed = time.perf_counter() - start
+    dispatcher.shutdown()
+    return result, elapsed
+
+
+def main(tasks=64, task_size=20000):
+    ranges = [(i * task_size, (i + 1) * task_size) for i in range(tasks)]
+
+    context = build_context()
+    service = PrimeService()
+    start = time.perf_counter()
+    expected = sum(service.count_primes(*r) for r in ranges)
+    baseline = time.perf_counter() - start
+    print(f"in process: {baseline:.3f}s")
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        result, elapsed = run(context, workers, ranges)
+        assert result == expected
+        print(f"{workers:3d} workers: {elapsed:.3f}s, speedup {baseline / elapsed:.2f}x")
+        workers *= 2
+
+    context.close()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -17,7 +17,8 @@ class UsersResource(Resource):
 
     def get(self):
         users = self._user_service.find_all()
-        return list(map(asdict, users))
+        # Streamed by the blueprint as users are read.
+        return map(asdict, users)
 
     def post(self):
         try:
@@ -60,12 +61,12 @@ class UserResource(Resource):
         return None, 204
 
 
-def build_app(ctx):
+def build_app(ctx, pool_size=0):
     app = Flask(__name__)
     api = Api(app)
 
     bp = pyoc.flask.BluePrint("main", __name__, "/", ctx)
-    bp.add_endpoint(UsersResource, "/users", methods=["GET", "POST"])
-    bp.add_endpoint(UserResource, "/users/<int:id>", methods=["GET", "DELETE", "PUT"])
+    bp.add_endpoint(UsersResource, "/users", methods=["GET", "POST"], pool_size=pool_size)
+    bp.add_endpoint(UserResource, "/users/<int:id>", methods=["GET", "DELETE", "PUT"], pool_size=pool_size)
     app.register_blueprint(bp)
     return app
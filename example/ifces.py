@@ -1,6 +1,6 @@
 from .model import User
 from abc import ABCMeta, abstractmethod
-from typing import List
+from typing import Iterator, List, Mapping
 
 
 class UserDao(metaclass=ABCMeta):
@@ -8,12 +8,16 @@ class UserDao(metaclass=ABCMeta):
     def get(self, id: int) -> User:
         pass
 
+    @abstractmethod
+    def get_many(self, ids: List[int]) -> Mapping[int, User]:
+        pass
+
     @abstractmethod
     def save(self, obj: User) -> User:
         pass
 
     @abstractmethod
-    def find_all(self) -> List[User]:
+    def find_all(self) -> Iterator[User]:
         pass
 
     @abstractmethod
@@ -31,7 +35,7 @@ class UserService(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def find_all(self) -> List[User]:
+    def find_all(self) -> Iterator[User]:
         pass
 
     @abstractmethod
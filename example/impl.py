@@ -1,7 +1,7 @@
 from .model import User
 from .ifces import UserDao, UserService
 import sqlite3
-from typing import List
+from typing import Iterator, List, Mapping
 
 
 class SQLUserDaoImpl(UserDao):
@@ -21,6 +21,16 @@ class SQLUserDaoImpl(UserDao):
 
         return None
 
+    def get_many(self, ids: List[int]) -> Mapping[int, User]:
+
+        c = self._conn.cursor()
+        try:
+            c.execute(f"select id, name from users where id in ({','.join('?' * len(ids))})", tuple(ids))
+
+            return {id: User(id, name) for id, name in c.fetchall()}
+        finally:
+            c.close()
+
     def save(self, user: User) -> User:
         c = self._conn.cursor()
 
@@ -40,11 +50,12 @@ class SQLUserDaoImpl(UserDao):
 
         return user
 
-    def find_all(self) -> List[User]:
+    def find_all(self) -> Iterator[User]:
         c = self._conn.cursor()
         try:
             c.execute("select id, name from users")
-            return [User(id, name) for id, name in c.fetchall()]
+            for id, name in c:
+                yield User(id, name)
         finally:
             c.close()
 
@@ -67,7 +78,7 @@ class UserServiceImpl(UserService):
     def save(self, obj: User) -> User:
         return self._dao.save(obj)
 
-    def find_all(self) -> List[User]:
+    def find_all(self) -> Iterator[User]:
         return self._dao.find_all()
 
     def delete(self, id: int):
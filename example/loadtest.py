@@ -0,0 +1,299 @@
+"""
+Load test of the example application: blueprint, resources, LogWrapper, service,
+DAO and sqlite, driven in process through the Flask test client, or through a
+threaded server on localhost.
+
+    python -m example.loadtest [--server] [--concurrency 8] [--requests 2000]
+                               [--mix list=1,get=9] [--users 100] [--pool-size 0]
+                               [--batching]
+
+Reports requests per second and latency percentiles per kind of request, and
+where the time of a request goes:
+    framework: Flask, flask_restful, and HTTP when running a server.
+    container: pyoc lookups and wrappers, the service and the resource itself.
+    batching: with --batching, the lookups of users by id waiting for a batch
+        to be dispatched, or for the query of another thread.
+    handler: DAO methods, connecting to and querying sqlite.
+"""
+import argparse
+import http.client
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+import pyoc
+from werkzeug.serving import make_server
+from .endpoints import UserResource, UsersResource, build_app
+from .model import User
+from .ifces import UserService
+from .support import build_context, create_database
+from .wrapper import UserBatchWrapper
+
+
+class Timings:
+    """
+    Time spent in a group of methods, by all threads, in total and by method name.
+    """
+
+    def __init__(self):
+        self.total = 0.0
+        self.calls = 0
+        self.methods = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.total = 0.0
+            self.calls = 0
+            self.methods = {}
+
+    def add(self, elapsed, method=None):
+        with self._lock:
+            self.total += elapsed
+            self.calls += 1
+            if method is not None:
+                self.methods[method] = self.methods.get(method, 0.0) + elapsed
+
+
+class TimingWrapper(pyoc.Wrapper):
+    """
+    Adds the time spent in the wrapped methods to timings. Iterator results, like
+    generators, are timed while they produce their items.
+    """
+
+    timings: Timings = None
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = self.next(*args, **kwargs)
+        finally:
+            self.timings.add(time.perf_counter() - start, self.target.__name__)
+        if isinstance(result, Iterator):
+            return self._timed(result)
+        return result
+
+    def _timed(self, items):
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            finally:
+                self.timings.add(time.perf_counter() - start, self.target.__name__)
+            yield item
+
+
+def timing_wrapper(timings):
+    return type("TimingWrapper", (TimingWrapper,), {"timings": timings})
+
+
+class BatchTimingWrapper(UserBatchWrapper):
+    """
+    UserBatchWrapper adding the time of the lookups it groups to timings, waits
+    included, so it can be told apart from the container's.
+    """
+
+    timings: Timings = None
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().__call__(*args, **kwargs)
+        finally:
+            self.timings.add(time.perf_counter() - start)
+
+
+def batch_timing_wrapper(timings):
+    return type("BatchTimingWrapper", (BatchTimingWrapper,), {"timings": timings})
+
+
+def parse_mix(mix):
+    """
+    Parses "list=1,get=9" into the kinds of request and their weights.
+    """
+    weights = {}
+    for entry in mix.split(","):
+        kind, weight = entry.split("=")
+        if kind not in ("list", "get"):
+            raise ValueError(f"Unknown request kind {kind}, expected list or get")
+        weights[kind] = float(weight)
+    return weights
+
+
+def make_requests(count, weights, user_ids, seed):
+    rnd = random.Random(seed)
+    kinds = rnd.choices(list(weights), list(weights.values()), k=count)
+    return [(kind, "/users" if kind == "list" else f"/users/{rnd.choice(user_ids)}") for kind in kinds]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+class TestClientDriver:
+    """
+    Sends requests through a Flask test client per thread.
+    """
+
+    def __init__(self, app):
+        self._app = app
+        self._local = threading.local()
+
+    def __call__(self, path):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self._app.test_client()
+        response = client.get(path)
+        response.get_data()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class ServerDriver:
+    """
+    Sends requests over HTTP to a threaded server on localhost.
+    """
+
+    def __init__(self, app):
+        # One line per request would be logged otherwise.
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        self._server = make_server("127.0.0.1", 0, app, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def __call__(self, path):
+        connection = http.client.HTTPConnection("127.0.0.1", self._server.server_port)
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    def close(self):
+        self._server.shutdown()
+        self._thread.join()
+
+
+def run(driver, requests, concurrency):
+    """
+    Sends the requests from concurrency threads, returns the latencies by kind and
+    the elapsed time.
+    """
+    latencies = {}
+    errors = []
+    lock = threading.Lock()
+    pending = iter(requests)
+
+    def _worker():
+        while True:
+            with lock:
+                request = next(pending, None)
+            if request is None:
+                return
+            kind, path = request
+            start = time.perf_counter()
+            status = driver(path)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.setdefault(kind, []).append(elapsed)
+                if status >= 400:
+                    errors.append((path, status))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        for future in [executor.submit(_worker) for _ in range(concurrency)]:
+            future.result()
+    return latencies, errors, time.perf_counter() - start
+
+
+def report(latencies, errors, elapsed, resource_timings, dao_timings, batch_timings=None):
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    count = len(all_latencies)
+    lines = [f"{count} requests in {elapsed:.3f}s, {count / elapsed:.1f} req/s, {len(errors)} errors"]
+    for kind, values in sorted(latencies.items()) + [("all", all_latencies)]:
+        lines.append(
+            f"  {kind:5s} {len(values):6d} requests  p50 {percentile(values, 0.5) * 1000:7.3f}ms"
+            f"  p99 {percentile(values, 0.99) * 1000:7.3f}ms"
+        )
+
+    total = sum(all_latencies)
+    if total:
+        batching = 0.0
+        if batch_timings is not None:
+            # Less the batch queries, which are handler time.
+            batching = batch_timings.total - dao_timings.methods.get(UserBatchWrapper.batch_method, 0.0)
+        breakdown = {
+            "framework": total - resource_timings.total,
+            "container": resource_timings.total - batching - dao_timings.total,
+            "batching": batching,
+            "handler": dao_timings.total,
+        }
+        if batch_timings is None:
+            del breakdown["batching"]
+        lines.append("time per request:")
+        for name, spent in breakdown.items():
+            lines.append(f"  {name:9s} {spent / count * 1000:7.3f}ms {spent / total * 100:5.1f}%")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test of the example application")
+    parser.add_argument("--server", action="store_true", help="send requests to a threaded server on localhost")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--mix", default="list=1,get=9", help="weights of the kinds of request, list and get")
+    parser.add_argument("--users", type=int, default=100, help="users in the database")
+    parser.add_argument("--pool-size", type=int, default=0, help="reuse a pool of resource instances")
+    parser.add_argument("--batching", action="store_true", help="group the lookups of users by id")
+    parser.add_argument("--warmup", type=int, default=100, help="requests sent before measuring")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    resource_timings, dao_timings = Timings(), Timings()
+    batch_timings = Timings() if args.batching else None
+    with tempfile.TemporaryDirectory() as directory:
+        db_filename = os.path.join(directory, "loadtest.db")
+        ctx = build_context(
+            db_filename,
+            dao_wrappers=[timing_wrapper(dao_timings)],
+            batch_wrapper=batch_timing_wrapper(batch_timings) if batch_timings else None,
+        )
+        create_database(ctx)
+        ctx.wrap(UsersResource, "get", timing_wrapper(resource_timings))
+        ctx.wrap(UserResource, "get", timing_wrapper(resource_timings))
+
+        user_service = ctx.get_by_type(UserService)
+        user_ids = [user_service.save(User(name=f"user {i}")).id for i in range(args.users)]
+
+        app = build_app(ctx, pool_size=args.pool_size)
+        driver = ServerDriver(app) if args.server else TestClientDriver(app)
+        try:
+            weights = parse_mix(args.mix)
+            run(driver, make_requests(args.warmup, weights, user_ids, args.seed), args.concurrency)
+            for timings in (resource_timings, dao_timings, batch_timings):
+                if timings is not None:
+                    timings.reset()
+
+            requests = make_requests(args.requests, weights, user_ids, args.seed)
+            latencies, errors, elapsed = run(driver, requests, args.concurrency)
+        finally:
+            driver.close()
+            ctx.close()
+
+    print(report(latencies, errors, elapsed, resource_timings, dao_timings, batch_timings))
+    return latencies, errors
+
+
+if __name__ == "__main__":
+    main()
@@ -11,10 +11,10 @@ import logging
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
 
-    create_database()
-
     ctx = build_context()
 
+    create_database(ctx)
+
     user_service = ctx.get_by_type(UserService)
 
     user_service.save(User(name="Carlos"))
@@ -2,33 +2,41 @@ import sqlite3
 import pyoc
 from .ifces import UserService
 from .impl import SQLUserDaoImpl, UserServiceImpl
-from .wrapper import LogWrapper
+from .wrapper import LogWrapper, UserBatchWrapper
 
 DB_FILENAME = "sample.db"
 
 
 class ConnectionFactory:
-    def __init__(self, dbfilename):
-        self._dbfilename = dbfilename
+    db_filename = pyoc.Value[str]("db.path", default=DB_FILENAME)
 
     def __call__(self, *_):
-        return sqlite3.connect(self._dbfilename)
-
-
-def build_context():
-    return (
-        pyoc.Context()
-        .add_factory(lambda i: i == sqlite3.Connection, ConnectionFactory(DB_FILENAME))
-        .add(SQLUserDaoImpl)
-        .add(UserServiceImpl)
-        .wrap(UserServiceImpl, ".*", LogWrapper)
-        .build()
-    )
-
-
-def create_database():
-
-    conn = sqlite3.connect(DB_FILENAME)
+        return sqlite3.connect(self.db_filename)
+
+
+def build_context(db_filename=None, dao_wrappers=(), batch_wrapper=UserBatchWrapper):
+    """
+    The database file can be given with the USERS_DB_PATH environment variable, or db_filename.
+    dao_wrappers are applied to all the DAO methods, inside the other wrappers. batch_wrapper
+    groups the lookups of users by id, None disables batching.
+    """
+    ctx = pyoc.Context().add_config(pyoc.EnvConfig("USERS_"))
+    if db_filename:
+        ctx.add_config({"db.path": db_filename})
+    ctx.add(sqlite3.Connection, factory=ConnectionFactory()).add(SQLUserDaoImpl).add(UserServiceImpl)
+    for wrapper in dao_wrappers:
+        ctx.wrap(SQLUserDaoImpl, ".*", wrapper)
+    if batch_wrapper:
+        ctx.wrap(SQLUserDaoImpl, "get$", batch_wrapper)
+    return ctx.wrap(UserServiceImpl, ".*", LogWrapper).build()
+
+
+def create_database(ctx):
+    """
+    Creates the users table in the database of a context from build_context, so both use
+    the same configured path.
+    """
+    conn = ctx.get(sqlite3.Connection)
 
     c = conn.cursor()
 
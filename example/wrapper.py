@@ -13,3 +13,16 @@ class LogWrapper(pyoc.Wrapper):
         logging.info(f"invoked {obj_name}.{method_name}({','.join(arg_str_list)})")
 
         return self.next(*args, **kwargs)
+
+    def on_complete(self, count):
+        obj_name = self.target.__self__.__class__.__name__
+        logging.info(f"{obj_name}.{self.target.__name__} produced {count} items")
+
+
+class UserBatchWrapper(pyoc.BatchWrapper):
+    """
+    Groups concurrent lookups of users by id into a single query.
+    """
+
+    batch_method = "get_many"
+    max_wait = 0.002
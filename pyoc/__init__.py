@@ -1,5 +1,30 @@
+import importlib
 from .context import Context
-from .exceptions import DependencyError
+from .exceptions import DependencyError, WrapperError
 from .ref import ref, refs
-from .wrapper import Wrapper
-from . import flask
+from .provider import Provider
+from .balance import Balanced
+from .config import ConfigSource, EnvConfig, Value
+from .wrapper import AsyncWrapper, Wrapper
+
+# Loaded on first access, they import modules (flask, asyncio, multiprocessing ...)
+# which are slow to import and not needed by every application.
+_lazy_members = {
+    "BatchWrapper": "batch",
+    "OffloadWrapper": "offload",
+    "ProcessWrapper": "process",
+    "SharedBuffer": "process",
+}
+_lazy_modules = {"batch", "flask", "offload", "process"}
+
+
+def __getattr__(name):
+    if name in _lazy_members:
+        return getattr(importlib.import_module(f".{_lazy_members[name]}", __name__), name)
+    if name in _lazy_modules:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_members) | _lazy_modules)
@@ -0,0 +1,158 @@
+import inspect
+import itertools
+import threading
+import time
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+POLICIES = ("round_robin", "least_in_flight", "ewma")
+
+
+class Balanced(Generic[T]):
+    """
+    Routes every method call to one of the implementations of a type registered in
+    the context. Injected for Balanced[T] type hints, the implementation is picked
+    per call with the policy configured by Context.set_balancing, round robin by default.
+    """
+
+    def __init__(self, get_balancer):
+        self._get_balancer = get_balancer
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        get_balancer = self._get_balancer
+
+        def method(*args, **kwargs):
+            return get_balancer().call(name, args, kwargs)
+
+        # Later lookups find it without going through __getattr__.
+        self.__dict__[name] = method
+        return method
+
+
+class _Target:
+    __slots__ = ("obj", "in_flight", "latency", "failures", "ejected_until", "calls", "errors")
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.in_flight = 0
+        self.latency = None
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.calls = 0
+        self.errors = 0
+
+
+class Balancer:
+    """
+    Balancing state of a type within a context: its implementations, the calls in
+    flight on each one and the moving average of their latency.
+
+    Policies:
+        round_robin: takes implementations in turns.
+        least_in_flight: takes the one with the fewest calls in progress.
+        ewma: takes the one with the lowest exponentially weighted moving average
+            latency, implementations not measured yet go first.
+
+    An implementation raising max_failures exceptions in a row is left out for
+    ejection_time seconds, unless all of them are.
+    """
+
+    def __init__(
+        self, targets, policy: str = "round_robin", max_failures: int = 3, ejection_time: float = 10.0, alpha=0.3
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown balancing policy {policy}, expected one of {', '.join(POLICIES)}")
+        self._targets = [_Target(target) for target in targets]
+        self._pick = getattr(self, f"_pick_{policy}")
+        self._max_failures = max_failures
+        self._ejection_time = ejection_time
+        self._alpha = alpha
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def call(self, method_name: str, args, kwargs):
+        target = self._acquire()
+        start = time.perf_counter()
+        try:
+            result = getattr(target.obj, method_name)(*args, **kwargs)
+        except Exception:
+            self._release(target, start, True)
+            raise
+        if inspect.isawaitable(result):
+            return self._await(target, start, result)
+        self._release(target, start, False)
+        return result
+
+    async def _await(self, target, start, result):
+        try:
+            value = await result
+        except Exception:
+            self._release(target, start, True)
+            raise
+        self._release(target, start, False)
+        return value
+
+    def stats(self):
+        """
+        Returns the calls, errors, calls in flight and average latency of every implementation.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "name": target.obj.__class__.__name__,
+                    "calls": target.calls,
+                    "errors": target.errors,
+                    "in_flight": target.in_flight,
+                    "latency": target.latency,
+                    "ejected": target.ejected_until > now,
+                }
+                for target in self._targets
+            ]
+
+    def _acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            available = [target for target in self._targets if target.ejected_until <= now] or self._targets
+            target = self._pick(available)
+            target.in_flight += 1
+            target.calls += 1
+        return target
+
+    def _release(self, target, start, failed):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            target.in_flight -= 1
+            if failed:
+                target.errors += 1
+                target.failures += 1
+                if target.failures >= self._max_failures:
+                    target.failures = 0
+                    target.ejected_until = time.monotonic() + self._ejection_time
+            else:
+                target.failures = 0
+                if target.latency is None:
+                    target.latency = elapsed
+                else:
+                    target.latency += self._alpha * (elapsed - target.latency)
+
+    def _pick_round_robin(self, available):
+        return available[next(self._counter) % len(available)]
+
+    def _pick_least_in_flight(self, available):
+        return self._pick_min(available, lambda target: target.in_flight)
+
+    def _pick_ewma(self, available):
+        return self._pick_min(available, lambda target: (target.latency or 0.0, target.in_flight))
+
+    def _pick_min(self, available, key):
+        # Ties are broken in turns, so equal implementations share the load.
+        count = len(available)
+        offset = next(self._counter) % count
+        return min(
+            (available[(offset + i) % count] for i in range(count)),
+            key=key,
+        )
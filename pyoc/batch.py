@@ -0,0 +1,191 @@
+import asyncio
+import inspect
+import threading
+import weakref
+from collections.abc import Mapping
+from concurrent.futures import Future
+from .wrapper import Wrapper, WrapperChain
+from . import fork
+
+
+class BatchWrapper(Wrapper):
+    """
+    Coalesces concurrent calls of a single argument method, like a lookup by id, into
+    one call of a batch method of the same object, which receives the list of arguments.
+    The batch method must return either a list of results in the same order, or a
+    mapping of argument to result.
+
+    Calls made from different threads within max_wait seconds of each other are
+    grouped, the first of them dispatches the batch. When the wrapped method or the
+    batch method is a coroutine function and an event loop is running, the wrapper
+    returns an awaitable, and calls made in the same loop iteration are grouped.
+    Other methods always return their value, even when called from a loop.
+
+    Configured by subclassing:
+
+        class UserBatchWrapper(pyoc.BatchWrapper):
+            batch_method = "get_many"
+            max_batch_size = 100
+            max_wait = 0.002
+
+        ctx.wrap(UserDaoImpl, "get$", UserBatchWrapper)
+    """
+
+    batch_method: str = None
+    max_batch_size: int = 100
+    max_wait: float = 0.001
+
+    # Pending batches, by context and wrapped function, so they are shared by all
+    # the instances of a type.
+    _batchers = weakref.WeakKeyDictionary()
+    _batchers_lock = threading.Lock()
+    # Whether calls from an event loop return awaitables, see _is_async.
+    _async = None
+
+    def __call__(self, *args, **kwargs):
+        if len(args) != 1 or kwargs:
+            return self.next(*args, **kwargs)
+
+        if self._is_async():
+            loop = asyncio._get_running_loop()
+            if loop is not None:
+                return self._load_async(loop, args[0])
+        return self._load(args[0])
+
+    def _is_async(self):
+        if self._async is None:
+            batch_method = getattr(self.target.__self__, self.batch_method)
+            if isinstance(batch_method, WrapperChain):
+                batch_method = batch_method.target
+            self._async = inspect.iscoroutinefunction(self.target) or inspect.iscoroutinefunction(batch_method)
+        return self._async
+
+    def _batcher(self):
+        function = getattr(self.target, "__func__", self.target)
+        batchers = self._batchers.get(self.context)
+        batcher = batchers.get(function) if batchers is not None else None
+        if batcher is None:
+            with self._batchers_lock:
+                batchers = self._batchers.setdefault(self.context, {})
+                batcher = batchers.setdefault(function, _Batcher())
+        return batcher
+
+    def _load(self, key):
+        batcher = self._batcher()
+
+        with batcher.lock:
+            batch = batcher.pending
+            leader = batch is None
+            if leader:
+                batch = batcher.pending = _Batch()
+            future = batch.futures.get(key)
+            if future is None:
+                future = batch.futures[key] = Future()
+                if len(batch.futures) >= self.max_batch_size:
+                    batcher.pending = None
+                    batch.full.set()
+
+        if leader:
+            batch.full.wait(self.max_wait)
+            with batcher.lock:
+                if batcher.pending is batch:
+                    batcher.pending = None
+            self._dispatch(batch.futures)
+
+        return future.result()
+
+    def _load_async(self, loop, key):
+        batcher = self._batcher()
+
+        batch = batcher.async_pending.get(loop)
+        if batch is None:
+            batch = batcher.async_pending[loop] = {}
+            if self.max_wait:
+                loop.call_later(self.max_wait, self._dispatch_async, batcher, loop, batch)
+            else:
+                loop.call_soon(self._dispatch_async, batcher, loop, batch)
+
+        future = batch.get(key)
+        if future is None:
+            future = batch[key] = loop.create_future()
+            if len(batch) >= self.max_batch_size:
+                self._dispatch_async(batcher, loop, batch)
+        return future
+
+    def _dispatch(self, futures):
+        keys = list(futures)
+        try:
+            results = self._call_batch(keys)
+        except Exception as e:
+            self._set_exception(futures, e)
+            return
+        self._set_results(futures, keys, results)
+
+    def _dispatch_async(self, batcher, loop, batch):
+        if batcher.async_pending.get(loop) is not batch:
+            # Already dispatched because it was full.
+            return
+        del batcher.async_pending[loop]
+
+        keys = list(batch)
+        try:
+            results = self._call_batch(keys)
+        except Exception as e:
+            self._set_exception(batch, e)
+            return
+
+        if inspect.isawaitable(results):
+
+            def _done(task):
+                if task.exception() is not None:
+                    self._set_exception(batch, task.exception())
+                else:
+                    self._set_results(batch, keys, task.result())
+
+            asyncio.ensure_future(results).add_done_callback(_done)
+        else:
+            self._set_results(batch, keys, results)
+
+    def _call_batch(self, keys):
+        return getattr(self.target.__self__, self.batch_method)(keys)
+
+    def _set_results(self, futures, keys, results):
+        if isinstance(results, Mapping):
+            results = [results.get(key) for key in keys]
+        else:
+            results = list(results)
+            if len(results) != len(keys):
+                self._set_exception(
+                    futures, ValueError(f"{self.batch_method} returned {len(results)} results for {len(keys)} keys")
+                )
+                return
+
+        for key, result in zip(keys, results):
+            future = futures[key]
+            if not future.done():
+                future.set_result(result)
+
+    def _set_exception(self, futures, exception):
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(exception)
+
+
+@fork.on_fork
+def _after_fork():
+    # Pending batches belong to threads of the parent process, and their locks may be held.
+    BatchWrapper._batchers = weakref.WeakKeyDictionary()
+    BatchWrapper._batchers_lock = threading.Lock()
+
+
+class _Batcher:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = None
+        self.async_pending = {}
+
+
+class _Batch:
+    def __init__(self):
+        self.futures = {}
+        self.full = threading.Event()
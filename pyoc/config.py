@@ -0,0 +1,234 @@
+import inspect
+import os
+import threading
+from abc import ABCMeta, abstractmethod
+from collections.abc import Mapping
+from typing import Generic, TypeVar
+from .exceptions import DependencyError
+from .ref import Dependency
+
+T = TypeVar("T")
+
+_MISSING = object()
+_TRUE = {"1", "true", "yes", "on"}
+_FALSE = {"0", "false", "no", "off"}
+
+
+class Value(Dependency, Generic[T]):
+    """
+    A configuration value, looked up by key in the sources added with Context.add_config
+    and converted to T. Used as class attribute, or as constructor parameter default:
+
+        class ConnectionFactory:
+            db_path = pyoc.Value[str]("db.path", default="sample.db")
+
+        class Pool:
+            def __init__(self, size=pyoc.Value[int]("db.pool.size", default=4)):
+                ...
+
+    Values are parsed when the context is built, and read from a table afterwards.
+    """
+
+    def __init__(self, key: str, default=_MISSING):
+        super().__init__(None, None, Dependency.CONFIG)
+        self.key = key
+        self.default = default
+
+    @property
+    def value_type(self):
+        """
+        T when created as Value[T](...), None otherwise.
+        """
+        orig_class = self.__dict__.get("__orig_class__")
+        return orig_class.__args__[0] if orig_class is not None else None
+
+    def __str__(self):
+        return f"Value(key={self.key})"
+
+
+class ConfigSource(metaclass=ABCMeta):
+    """
+    A layer of configuration. load returns a mapping of the keys it defines,
+    read when the context is built and on Context.reload_config.
+    """
+
+    @abstractmethod
+    def load(self) -> Mapping:
+        pass  # pragma: no cover
+
+    def normalize(self, key: str) -> str:
+        """
+        Translates a configuration key into a key of the mapping returned by load.
+        """
+        return key
+
+
+class DictConfig(ConfigSource):
+    """
+    Values from a dictionary, nested dictionaries define dotted keys: {"db": {"path": ...}}
+    defines "db.path".
+    """
+
+    def __init__(self, values: Mapping):
+        self._values = values
+
+    def load(self):
+        return _flatten(self._values)
+
+
+class EnvConfig(ConfigSource):
+    """
+    Values from environment variables, "db.path" is read from {prefix}DB_PATH.
+    """
+
+    def __init__(self, prefix: str = ""):
+        self._prefix = prefix
+
+    def load(self):
+        return {name: value for name, value in os.environ.items() if name.startswith(self._prefix)}
+
+    def normalize(self, key):
+        return f"{self._prefix}{key.upper().replace('.', '_')}"
+
+
+class JsonConfig(ConfigSource):
+    """
+    Values from a JSON file with an object, nested objects define dotted keys.
+    """
+
+    def __init__(self, path):
+        self._path = path
+
+    def load(self):
+        import json
+
+        with open(self._path) as f:
+            return _flatten(json.load(f))
+
+
+class IniConfig(ConfigSource):
+    """
+    Values from an INI file, option "path" of section "db" defines "db.path".
+    """
+
+    def __init__(self, path):
+        self._path = path
+
+    def load(self):
+        import configparser
+
+        parser = configparser.ConfigParser()
+        with open(self._path) as f:
+            parser.read_file(f)
+        return {f"{section}.{option}": value for section in parser.sections() for option, value in parser[section].items()}
+
+
+def config_source(source) -> ConfigSource:
+    """
+    Returns a ConfigSource for a mapping, or for the path of a JSON or INI file.
+    """
+    if isinstance(source, ConfigSource):
+        return source
+    if isinstance(source, Mapping):
+        return DictConfig(source)
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        if path.endswith(".json"):
+            return JsonConfig(path)
+        if path.endswith((".ini", ".cfg")):
+            return IniConfig(path)
+    raise ValueError(f"Unsupported configuration source {source!r}")
+
+
+class ConfigTable:
+    """
+    Parsed configuration values of a context, by Value.
+    """
+
+    def __init__(self):
+        self._sources = []
+        self._snapshots = None
+        # Value -> (raw value, parsed value)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def add_source(self, source: ConfigSource):
+        with self._lock:
+            # Values already parsed are kept until reload.
+            self._sources.append(source)
+            self._snapshots = None
+
+    def prepare(self, values):
+        """
+        Parses the given values, unless they are already.
+        """
+        for value in values:
+            if value not in self._values:
+                self.get(value)
+
+    def get(self, value: Value):
+        entry = self._values.get(value)
+        if entry is None:
+            with self._lock:
+                entry = self._values.get(value)
+                if entry is None:
+                    entry = self._values[value] = self._parse(value)
+        return entry[1]
+
+    def reload(self):
+        """
+        Reads the sources again, returns the keys of the values which changed.
+        """
+        with self._lock:
+            self._snapshots = None
+            changed = set()
+            for value, (raw, _) in list(self._values.items()):
+                entry = self._parse(value)
+                if entry[0] != raw:
+                    changed.add(value.key)
+                self._values[value] = entry
+        return changed
+
+    def _parse(self, value):
+        if self._snapshots is None:
+            self._snapshots = [(source, source.load()) for source in self._sources]
+
+        raw = _MISSING
+        for source, snapshot in reversed(self._snapshots):
+            raw = snapshot.get(source.normalize(value.key), _MISSING)
+            if raw is not _MISSING:
+                break
+        if raw is _MISSING:
+            if value.default is _MISSING:
+                raise DependencyError(f"No configuration value for {value.key}")
+            return raw, value.default
+        try:
+            return raw, _coerce(raw, value.value_type)
+        except (TypeError, ValueError) as e:
+            raise DependencyError(f"Invalid configuration value {raw!r} for {value.key}: {e}") from e
+
+
+def _coerce(raw, value_type):
+    if not inspect.isclass(value_type) or isinstance(raw, value_type):
+        return raw
+    if value_type is bool:
+        text = str(raw).strip().lower()
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+        raise ValueError("expected a boolean")
+    return value_type(raw)
+
+
+def _flatten(values, prefix=""):
+    flat = {}
+    for key, value in values.items():
+        if isinstance(value, Mapping):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
@@ -1,15 +1,40 @@
+import functools
 import inspect
+import sys
+import threading
+import time
+import weakref
 from collections import defaultdict
 import typing
 from typing import Any, Callable, List, Type, TypeVar, Union
-from mock.mock import MagicMock
 from .exceptions import DependencyError
-from .wrapper import WrapperDefinition, Wrapper, WrapperChain
+from .wrapper import WrapperDefinition, Wrapper, WrapperChain, check_chain
 from .factory import FactoryDefinition, FactoryProxy
 from .ref import Dependency
+from .lazy import LazyIterable, LazyMapping
+from .provider import Provider
+from .balance import Balanced, Balancer
+from .config import ConfigTable, config_source
+from .startup import StartupRecorder, StartupReport
+from . import fork
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from concurrent.futures import ThreadPoolExecutor
 
 T = TypeVar("T", bound=object)
 
+# Processed types are shared by all the contexts, by original type and wrapper
+# configuration. Entries go away once no context uses them.
+_processed_types = weakref.WeakValueDictionary()
+_processed_types_lock = threading.Lock()
+
+
+@fork.on_fork
+def _after_fork():
+    # Another thread may have held it when the process forked.
+    global _processed_types_lock
+    _processed_types_lock = threading.Lock()
+
 
 class Context:
     """
@@ -17,15 +42,182 @@ class Context:
     for instantiating them
     """
 
-    def __init__(self):
+    def __init__(self, max_workers: int = None):
+        """
+        Parameters:
+            max_workers: (optional) size of the thread pool used by OffloadWrapper.
+        """
         self._obj_types = []
         self._obj_type_dict = {}
         self._obj_type_name_dict = {}
         self._singletons = {}
         self._factories = []
         self._wrappers = []
+        self._obj_type_tag_dict = defaultdict(list)
+        self._obj_type_qualifier_dict = {}
+        self._type_cache = {}
+        # Search expressions are often lambdas created per call, they aren't kept alive.
+        self._expr_cache = weakref.WeakKeyDictionary()
+        self._fork_unsafe_singletons = {}
+        self._forked_singletons = []
+        self._wired = weakref.WeakSet()
+        self._max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._process_dispatcher = None
+        self._startup = StartupRecorder()
+        self._bound_types = {}
+        self._memory = None
+        self._balancing = {}
+        self._balancers = {}
+        self._balancers_lock = threading.RLock()
+        self._config = ConfigTable()
+        self._config_listeners = []
+        fork.register(self)
+
+    @property
+    def executor(self) -> "ThreadPoolExecutor":
+        """
+        Thread pool to run methods wrapped with OffloadWrapper, created on first use.
+        """
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self._max_workers, thread_name_prefix="pyoc")
+        return self._executor
+
+    def set_process_pool(self, spec: Callable, max_workers: int = None):
+        """
+        Configures the worker processes used by ProcessWrapper.
+        Parameters:
+            spec: a picklable callable, like a module level function, which returns the built
+                context of each worker process.
+            max_workers: (optional) number of worker processes.
+        """
+        from .process import ProcessDispatcher
+
+        if self._process_dispatcher is not None:
+            self._process_dispatcher.shutdown()
+        self._process_dispatcher = ProcessDispatcher(spec, max_workers)
+        return self
+
+    @property
+    def process_dispatcher(self):
+        """
+        Runs methods of context objects in worker processes, see set_process_pool.
+        """
+        if self._process_dispatcher is None:
+            raise RuntimeError("No process pool configured, see Context.set_process_pool")
+        return self._process_dispatcher
+
+    def add_config(self, source):
+        """
+        Adds a layer of configuration for Value fields and parameters, later layers take
+        precedence. Sources are read when the context is built.
+        Parameters:
+            source: a dictionary, the path of a JSON or INI file, or a ConfigSource like
+                pyoc.EnvConfig("APP_").
+        """
+        self._config.add_source(config_source(source))
+        return self
+
+    def on_config_change(self, listener: Callable):
+        """
+        Registers a callable which receives the set of changed keys after reload_config.
+        """
+        self._config_listeners.append(listener)
+        return self
+
+    def reload_config(self):
+        """
+        Reads the configuration sources again, returns the keys of the changed values.
+        Singletons which received a changed value, and those which received them through
+        their constructor, are released to be created again on demand. Listeners are
+        notified afterwards.
+        """
+        changed = self._config.reload()
+        if changed:
+            affected = [t for t in self._obj_types if t.config_keys & changed]
+            for type_info in affected:
+                if type_info.factory and type_info.processed:
+                    self._process_object(type_info.factory)
+            for type_info in self._constructor_dependents(affected):
+                self._release(type_info)
+            for listener in list(self._config_listeners):
+                listener(changed)
+        return changed
+
+    def set_balancing(
+        self, obj_type: Type, policy: str = "round_robin", max_failures: int = 3, ejection_time: float = 10.0
+    ):
+        """
+        Configures how calls through Balanced[obj_type] are spread among the implementations of obj_type.
+        Parameters:
+            obj_type: the type injected as Balanced[obj_type].
+            policy: "round_robin", "least_in_flight" or "ewma" (lowest average latency).
+            max_failures: consecutive exceptions after which an implementation is left out.
+            ejection_time: seconds an implementation is left out for.
+        """
+        Balancer([], policy)  # Fails early on unknown policies.
+        with self._balancers_lock:
+            self._balancing[obj_type] = dict(policy=policy, max_failures=max_failures, ejection_time=ejection_time)
+            self._balancers.pop(obj_type, None)
+        return self
+
+    def get_balanced(self, obj_type: Type[T]) -> T:
+        """
+        Returns a proxy which routes every method call to one of the implementations of obj_type.
+        """
+        return Balanced(functools.partial(self.balancer, obj_type))
+
+    def balancer(self, obj_type: Type) -> Balancer:
+        """
+        Returns the balancing state of a type, created with its implementations on first use.
+        """
+        balancer = self._balancers.get(obj_type)
+        if balancer is None:
+            with self._balancers_lock:
+                balancer = self._balancers.get(obj_type)
+                if balancer is None:
+                    type_infos = self._find_types(obj_type)
+                    if not type_infos:
+                        raise DependencyError(f"No implementations of {obj_type.__name__} to balance")
+                    balancer = self._balancers[obj_type] = Balancer(
+                        [self._instantiate_dependency(None, type_info) for type_info in type_infos],
+                        **self._balancing.get(obj_type, {}),
+                    )
+        return balancer
+
+    def track_memory(self, sample_every: int = 16):
+        """
+        Starts counting the live instances created by this context, per type and scope,
+        see memory_report. Instances are tracked with weak references.
+        Parameters:
+            sample_every: the size of one in every sample_every instances of a type is measured.
+        """
+        from .memory import MemoryTracker
+
+        if self._memory is None:
+            self._memory = MemoryTracker(sample_every)
+        return self
+
+    def memory_report(self):
+        """
+        Returns a snapshot of the live instances, their peak counts and approximate sizes.
+        Snapshots can be compared with MemoryReport.diff.
+        """
+        if self._memory is None:
+            raise RuntimeError("Memory tracking is not enabled, see Context.track_memory")
+        return self._memory.snapshot()
 
     def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._process_dispatcher is not None:
+            self._process_dispatcher.shutdown()
         for obj in self._singletons.values():
             if hasattr(obj, "release"):
                 obj.release()
@@ -33,7 +225,15 @@ class Context:
         self._singletons.clear()
 
     def add(
-        self, obj_type: Type, name: str = None, factory: Callable = None, lazy: bool = True, singleton: bool = False
+        self,
+        obj_type: Type,
+        name: str = None,
+        factory: Callable = None,
+        lazy: bool = True,
+        singleton: bool = False,
+        tags: List[str] = None,
+        qualifier: str = None,
+        fork_safe: bool = True,
     ):
         """
         Add an object to the context, which can be a concrete type, or a factory.
@@ -45,27 +245,38 @@ class Context:
             lazy: create the object on demand or when context is built.
             singleton: specifies if it is a singleton or new instances must be
                 returned all the time.
+            tags: (optional) tags to find the object with get_all_by_tag.
+            qualifier: (optional) distinguishes the object among others of the same type,
+                see get_by_qualifier.
+            fork_safe: False if a singleton can't be shared with forked processes, like
+                one holding sockets or database connections. Forked processes create their own.
         Return value:
             the desired object.
         """
-        self._obj_types.append(TypeDefinition(obj_type, name, lazy, singleton, factory))
+        self._obj_types.append(TypeDefinition(obj_type, name, lazy, singleton, factory, tags, qualifier, fork_safe))
         return self
 
-    def add_object(self, obj: Any, name=None):
+    def add_object(self, obj: Any, name=None, tags: List[str] = None, qualifier: str = None):
         """
         Adds an object instance. This object will behave as a singleton.
         Parameters:
             obj: The object to add to the context.
             name: optional, the object name
+            tags: optional, tags to find the object with get_all_by_tag.
+            qualifier: optional, see get_by_qualifier.
         """
-        obj_type = TypeDefinition(obj.__class__, name, False, True, None)
+        obj_type = TypeDefinition(obj.__class__, name, False, True, None, tags, qualifier)
+        # Already constructed, no constructor plan needed.
+        obj_type.constructor = []
         self._obj_types.append(obj_type)
         self._singletons[obj.__class__] = obj
         if name:
             self._obj_type_name_dict[name] = obj_type
         return self
 
-    def add_factory(self, type_selector: Callable, factory_function: Callable, singleton: bool = False):
+    def add_factory(
+        self, type_selector: Callable, factory_function: Callable, singleton: bool = False, fork_safe: bool = True
+    ):
         """
         Adds a factory with a type selector.
         Parameters:
@@ -74,10 +285,66 @@ class Context:
 
             factory_function: A callable that receives the class and the context as parameters, must provide
                 and object.
+
+            fork_safe: see add.
+        """
+        self._factories.append(FactoryDefinition(type_selector, factory_function, singleton, fork_safe))
+        self._invalidate_caches()
+        return self
+
+    def remove(self, type_or_name: Union[str, Type]):
         """
-        self._factories.append(FactoryDefinition(type_selector, factory_function, singleton))
+        Removes the objects registered with a given name, or with a given type or a subclass of it.
+        Their singletons are released, and so are the singletons which received them through their
+        constructor.
+        """
+        if isinstance(type_or_name, str):
+            removed = [t for t in self._obj_types if self._registered_name(t) == type_or_name]
+        else:
+            removed = [t for t in self._obj_types if issubclass(t.obj_type, type_or_name)]
+
+        for type_info in removed:
+            self._obj_types.remove(type_info)
+            if self._obj_type_dict.get(type_info.obj_type) is type_info:
+                del self._obj_type_dict[type_info.obj_type]
+            if self._obj_type_name_dict.get(self._registered_name(type_info)) is type_info:
+                del self._obj_type_name_dict[self._registered_name(type_info)]
+            for tag in type_info.tags:
+                # Tags are indexed when the type is built.
+                if type_info in self._obj_type_tag_dict[tag]:
+                    self._obj_type_tag_dict[tag].remove(type_info)
+            if type_info.qualifier is not None:
+                for key in [k for k, t in self._obj_type_qualifier_dict.items() if t is type_info]:
+                    del self._obj_type_qualifier_dict[key]
+            self._release(type_info)
+
+        if removed:
+            for type_info in self._obj_types:
+                if type_info.qualifier is not None and type_info.processed:
+                    # Another object may take over the removed qualifiers.
+                    self._index_type(type_info)
+            for type_info in self._invalidate_types([t.obj_type for t in removed], removed):
+                self._release(type_info)
         return self
 
+    def replace(self, type_or_name: Union[str, Type], obj_type: Type, **kwargs):
+        """
+        Replaces the objects registered with a given name, or a given type or its subclasses, with
+        a new type, and builds the context. Takes the same parameters as add, the name is kept unless
+        a new one is given. Raises DependencyError when nothing is registered to be replaced.
+        """
+        if isinstance(type_or_name, str):
+            replaced = [t for t in self._obj_types if self._registered_name(t) == type_or_name]
+            kwargs.setdefault("name", type_or_name)
+        else:
+            replaced = [t for t in self._obj_types if issubclass(t.obj_type, type_or_name)]
+            names = [t.name for t in replaced if t.name]
+            if names:
+                kwargs.setdefault("name", names[0])
+        if not replaced:
+            raise DependencyError(f"Nothing registered as {getattr(type_or_name, '__name__', type_or_name)} to replace")
+        return self.remove(type_or_name).add(obj_type, **kwargs).build()
+
     def wrap(self, obj_type: Type, method_expr: str, wrapper_type: Callable):
         """
         Adds a wrapper callable around a methods which match with a given regular expression in a given
@@ -86,12 +353,15 @@ class Context:
         self._wrappers.append(WrapperDefinition(obj_type, method_expr, wrapper_type))
         return self
 
-    def get(self, type_or_name: Union[str, Type[T]]) -> T:
+    def get(self, type_or_name: Union[str, Type[T]], qualifier: str = None) -> T:
         """
-        Returns an object by either its type or its name.
+        Returns an object by either its type or its name. When a qualifier is given
+        the object must have been registered with it.
         """
         if isinstance(type_or_name, str):
             return self.get_by_name(type_or_name)
+        if qualifier is not None:
+            return self.get_by_qualifier(type_or_name, qualifier)
         return self.get_by_type(type_or_name)
 
     def get_by_type(self, obj_type: Type[T]) -> T:
@@ -110,10 +380,38 @@ class Context:
         """
         return [self._instantiate_dependency(None, t) for t in self._find_types(obj_type)]
 
+    def get_by_qualifier(self, obj_type: Type[T], qualifier: str) -> T:
+        """
+        Returns an object of the desired type, or a subclass, registered with the given qualifier.
+        """
+        actual_obj_type = self._obj_type_qualifier_dict.get((obj_type, qualifier))
+
+        if actual_obj_type:
+            return self._instantiate_dependency(None, actual_obj_type)
+        return None
+
+    def get_all_by_tag(self, tag: str) -> List[Any]:
+        """
+        Returns all objects registered with the given tag.
+        """
+        return [self._instantiate_dependency(None, t) for t in self._obj_type_tag_dict.get(tag, [])]
+
+    def get_provider(self, obj_type: Type[T]) -> Provider[T]:
+        """
+        Returns a provider of objects of the desired type, or None if the type can't be resolved.
+        """
+        actual_obj_type = self._find_type(obj_type)
+
+        if actual_obj_type:
+            return Provider(self._creator(actual_obj_type))
+        return None
+
     def get_by_expr(self, search_expr: Callable) -> Any:
         """
         Creates a new instance given a search expression over object types.
         Must be a callable which receives as parameter a type and return True or False.
+        Results are remembered for each search expression until new objects are registered,
+        or the expression is garbage collected.
         """
         actual_obj_type = self._find_type_by_expr(search_expr)
 
@@ -137,7 +435,7 @@ class Context:
         Processes a class to prepare it to self resolve its dependencies once
         instantiated.
         """
-        return self._process_type(obj_type)
+        return self._bind(self._process_type(obj_type))
 
     def new(self, obj_type: Type[T], *args, **kwargs) -> T:
         """
@@ -151,9 +449,11 @@ class Context:
             processed_type = self._process_type(obj_type)
             type_info = TypeDefinition(obj_type, None, True, False, None)
             type_info.processed_type = processed_type
+            type_info.constructor = []
             self._obj_type_dict[obj_type] = type_info
+            self._invalidate_types([obj_type])
 
-        result = type_info.processed_type(*args, **kwargs)
+        result = self._construct(type_info.processed_type, *args, **kwargs)
 
         return result
 
@@ -165,50 +465,412 @@ class Context:
         """
         actual_obj_type = self._find_type(obj_type)
         if actual_obj_type:
-            if actual_obj_type.processed_type():
-                return actual_obj_type.processed_type()
+            if actual_obj_type.processed_type:
+                return self._bind(actual_obj_type.processed_type)
 
             return obj_type
         return None
 
-    def build(self):
-        self._process_obj_types()
+    def build(self, roots: List[Union[Type, str]] = None):
+        """
+        Processes the types registered since the last build, and creates the singletons
+        registered as not lazy.
+        Parameters:
+            roots: (optional) types or names of the entry points. Only the registered types
+                they reach through annotations, refs and constructor parameters are processed,
+                the others stay pending for a later build. Objects only looked up with get
+                must be given as roots. The pruned types are listed by startup_report.
+        """
+        type_infos = None
+        if roots is not None:
+            type_infos = self._reachable(roots)
+            pruned = set(type_infos)
+            self._startup.pruned = [t.obj_type for t in self._obj_types if not t.processed and t not in pruned]
+        else:
+            self._startup.pruned = []
+        self._warm_up(self._process_obj_types(type_infos))
         return self
 
+    def startup_report(self) -> StartupReport:
+        """
+        Returns the time spent building each component and creating its first
+        instance, along with the dependencies that caused it to be created.
+        """
+        return self._startup.report()
+
+    def _warm_up(self, type_infos):
+        for type_info in type_infos:
+            if not type_info.lazy and type_info.singleton:
+                self._instantiate_dependency(None, type_info)
+
     def _get_instance(self, type_info):
+        if not type_info.constructed:
+            obj = self._startup.construct(type_info, self._create_instance)
+        else:
+            obj = self._create_instance(type_info)
+        if self._memory is not None:
+            self._memory.track(type_info, obj)
+        return obj
+
+    def _create_instance(self, type_info):
+        if type_info.constructor is None and not type_info.factory:
+            # Dropped when one of its dependencies was removed.
+            type_info.constructor = self._compile_constructor(type_info.obj_type)
+
         if type_info.factory:
             obj = type_info.factory(self)
+        elif type_info.constructor:
+            obj = self._construct(
+                type_info.processed_type,
+                **{
+                    name: self._instantiate_dependency(dependency, dependency_type)
+                    for name, dependency, dependency_type in type_info.constructor
+                },
+            )
         else:
-            obj = type_info.processed_type()
+            obj = self._construct(type_info.processed_type)
+        return obj
+
+    def wire(self, obj: T) -> T:
+        """
+        Resolves all the injected fields of an object created by this context once, later
+        accesses return the same objects without going through the context. Wired fields
+        holding singletons which are not fork safe are resolved again after a fork, except
+        for objects without weak references support, like slotted ones without __weakref__.
+        """
+        dependencies = getattr(type(obj), "__pyoc_dependencies__", None)
+        if dependencies:
+            wired = {name: self._resolve(dependency, name, obj.__class__) for name, dependency in dependencies.items()}
+            object.__setattr__(obj, "__pyoc_wired__", wired)
+            try:
+                self._wired.add(obj)
+            except TypeError:
+                # Not kept alive to be unwired after a fork.
+                pass
+        return obj
+
+    def _construct(self, processed_type, *args, **kwargs):
+        """
+        Creates an instance of a processed type, bound to this context.
+        """
+        slot_dependencies = processed_type.__pyoc_slot_dependencies__
+        if processed_type.__getattribute__ is object.__getattribute__ and not slot_dependencies:
+            # Nothing to resolve through the context.
+            return processed_type(*args, **kwargs)
+
+        obj = processed_type.__new__(processed_type, *args, **kwargs)
+        object.__setattr__(obj, "__pyoc_context__", self)
+        self._fill_slots(obj, slot_dependencies, processed_type)
+        if isinstance(obj, processed_type):
+            processed_type.__init__(obj, *args, **kwargs)
         return obj
 
+    def _fill_slots(self, obj, slot_dependencies, processed_type):
+        """
+        Slots can't be resolved on access, they are filled before __init__ runs.
+        """
+        for name, dependency in slot_dependencies.items():
+            object.__setattr__(obj, name, self._resolve(dependency, name, processed_type.__bases__[0]))
+
+    def _bind(self, processed_type):
+        """
+        Returns a subclass of a processed type bound to this context, for classes
+        instantiated by someone else.
+        """
+        bound_type = self._bound_types.get(processed_type)
+        if bound_type is None:
+            class_dict = {"__slots__": (), "__pyoc_context__": self}
+            slot_dependencies = processed_type.__pyoc_slot_dependencies__
+            if slot_dependencies:
+                base_new = processed_type.__new__
+
+                def __new__(cls, *args, **kwargs):
+                    # object.__new__ rejects arguments once __new__ is overridden.
+                    obj = base_new(cls) if base_new is object.__new__ else base_new(cls, *args, **kwargs)
+                    self._fill_slots(obj, slot_dependencies, processed_type)
+                    return obj
+
+                class_dict["__new__"] = __new__
+            bound_type = self._bound_types[processed_type] = type(processed_type.__name__, (processed_type,), class_dict)
+        return bound_type
+
+    def _resolve(self, dependency, attr, requester):
+        """
+        Resolves a dependency of an object of type requester.
+        """
+        dependency_type = self._resolve_dependency_type(dependency)
+        if dependency_type is None:
+            raise DependencyError(dependency.name or dependency.type, attr)
+        if isinstance(dependency_type, TypeDefinition) and not dependency_type.constructed:
+            # Record the requester as the one which caused the creation.
+            return self._startup.requested(requester, self._instantiate_dependency, dependency, dependency_type)
+        return self._instantiate_dependency(dependency, dependency_type)
+
+    def _creator(self, type_info):
+        """
+        Returns a callable without arguments which creates objects of a given type.
+        """
+        if type_info.singleton:
+            return functools.partial(self._instantiate_dependency, None, type_info)
+        elif type_info.constructor:
+            return functools.partial(self._get_instance, type_info)
+        elif type_info.factory:
+            create = functools.partial(type_info.factory, self)
+        else:
+            create = functools.partial(self._construct, type_info.processed_type)
+
+        def creator():
+            # Memory tracking may be enabled after the provider was created.
+            if self._memory is not None:
+                return self._get_instance(type_info)
+            return create()
+
+        return creator
+
     def _instantiate_dependency(self, dependency, type_info):
         if isinstance(type_info, list):
+            if dependency is not None:
+                if dependency.is_balanced:
+                    return self.get_balanced(dependency.type)
+                if dependency.is_iterable:
+                    return LazyIterable(self, dependency, type_info)
+                elif dependency.is_iterator:
+                    return iter(LazyIterable(self, dependency, type_info))
             return [self._instantiate_dependency(dependency, t) for t in type_info]
         elif isinstance(type_info, dict):
-            return {k: self._instantiate_dependency(dependency, v) for k, v in type_info.items()}
+            return LazyMapping(self, dependency, type_info)
         else:
+            if dependency is not None:
+                if dependency.is_provider:
+                    return Provider(self._creator(type_info))
+                if dependency.is_config:
+                    return type_info.get(dependency)
             if type_info.singleton:
                 instance = self._singletons.get(type_info.obj_type)
                 if instance is None:
                     instance = self._get_instance(type_info)
                     self._singletons[type_info.obj_type] = instance
+                    if not type_info.fork_safe:
+                        self._fork_unsafe_singletons[type_info.obj_type] = type_info
                 return instance
             return self._get_instance(type_info)
 
-    def _process_obj_types(self):
-        for type_info in self._obj_types:
+    def _process_obj_types(self, type_infos=None):
+        """
+        Processes the types registered since the last call, or the pending ones among
+        type_infos, returns them.
+        """
+        if type_infos is None:
+            type_infos = self._obj_types
+        pending = [type_info for type_info in type_infos if not type_info.processed]
+
+        for type_info in pending:
             obj_type = type_info.obj_type
+            start = time.perf_counter()
             if not type_info.factory:
                 type_info.processed_type = self._process_type(obj_type)
             else:
                 if isinstance(type_info.factory, object):
                     type_info.factory = self._process_object(type_info.factory)
-            if type_info.name:
-                self._obj_type_name_dict[type_info.name] = type_info
-            else:
-                self._obj_type_name_dict[obj_type.__name__] = type_info
+            self._obj_type_name_dict[self._registered_name(type_info)] = type_info
             self._obj_type_dict[obj_type] = type_info
+            self._index_type(type_info)
+            type_info.processed = True
+            self._startup.processed(obj_type, time.perf_counter() - start)
+
+        self._invalidate_types([type_info.obj_type for type_info in pending])
+
+        # Constructor plans are compiled once every type is known, so they can be
+        # resolved against the whole context.
+        for type_info in self._obj_types:
+            if type_info.processed_type is not None and type_info.constructor is None:
+                # New types, and types depending on the new ones.
+                start = time.perf_counter()
+                type_info.constructor = self._compile_constructor(type_info.obj_type)
+                self._startup.processed(type_info.obj_type, time.perf_counter() - start)
+
+        for type_info in pending:
+            values = self._config_values(type_info)
+            type_info.config_keys = {value.key for value in values}
+            # Parsed once here, objects read them from the table.
+            self._config.prepare(values)
+
+        return pending
+
+    def _config_values(self, type_info):
+        """
+        Configuration values declared by a registered type, or its factory object.
+        """
+        if type_info.factory:
+            members = list(vars(type(type_info.factory)).values())
+        else:
+            processed_type = type_info.processed_type
+            members = list(processed_type.__pyoc_dependencies__.values())
+            members += processed_type.__pyoc_slot_dependencies__.values()
+            members += [dependency for _, dependency, _ in type_info.constructor or ()]
+        return [member for member in members if isinstance(member, Dependency) and member.is_config]
+
+    def _constructor_dependents(self, type_infos):
+        """
+        Returns the given types along with the ones receiving them, directly or not,
+        through their constructor.
+        """
+        dependents = list(type_infos)
+        added = dependents
+        while added:
+            added = [
+                t
+                for t in self._obj_types
+                if t not in dependents
+                and t.constructor
+                and any(self._plan_depends_on(d, dt, (), dependents) for _, d, dt in t.constructor)
+            ]
+            dependents += added
+        return dependents
+
+    def _reachable(self, roots):
+        """
+        Returns the registered types reachable from the roots through the dependencies
+        declared by each type, its factory object and its wrappers.
+        """
+        reachable = {}
+        stack = []
+        for root in roots:
+            dependency = Dependency(root, None) if isinstance(root, str) else Dependency(None, root)
+            stack.extend(self._registrations_for(dependency))
+
+        while stack:
+            type_info = stack.pop()
+            if type_info in reachable:
+                continue
+            reachable[type_info] = None
+
+            if type_info.factory:
+                declaring_types = [type(type_info.factory)]
+            else:
+                declaring_types = [type_info.obj_type]
+            declaring_types += [wi.wrapper_type for wi in self._find_wrappers(type_info.obj_type)]
+            for declaring_type in declaring_types:
+                for dependency in self._declared_dependencies(declaring_type):
+                    stack.extend(self._registrations_for(dependency))
+        return list(reachable)
+
+    def _declared_dependencies(self, obj_type):
+        """
+        Dependencies declared by a class, found without processing it.
+        """
+        dependencies = list(self._find_field_dependencies(obj_type).values())
+        for annotation, _ in self._constructor_params(obj_type).values():
+            dependencies.append(self._make_dependency(annotation))
+        for member in self._make_class_dict(obj_type).values():
+            if isinstance(member, Dependency):
+                dependencies.append(member)
+            elif self._hasattr(member, "_dependency"):
+                dependencies.append(member._dependency)
+        return [dependency for dependency in dependencies if dependency]
+
+    def _registrations_for(self, dependency):
+        if dependency.name:
+            return [t for t in self._obj_types if self._registered_name(t) == dependency.name]
+        elif inspect.isclass(dependency.type):
+            return [t for t in self._obj_types if issubclass(t.obj_type, dependency.type)]
+        return []
+
+    def _registered_name(self, type_info):
+        return type_info.name or type_info.obj_type.__name__
+
+    def _release(self, type_info):
+        obj = self._singletons.pop(type_info.obj_type, None)
+        if obj is not None and hasattr(obj, "release"):
+            obj.release()
+
+    def _invalidate_types(self, obj_types, removed=()):
+        """
+        Drops the cached lookups which may resolve to the given types, and the
+        constructor plans which may depend on them. Returns the types whose
+        constructor plan was dropped.
+        """
+        for key in list(self._type_cache):
+            if any(issubclass(obj_type, key) for obj_type in obj_types):
+                del self._type_cache[key]
+        self._expr_cache.clear()
+        with self._balancers_lock:
+            for key in list(self._balancers):
+                if any(issubclass(obj_type, key) for obj_type in obj_types):
+                    # Proxies get a new balancer with the current implementations.
+                    del self._balancers[key]
+
+        invalidated = []
+        for type_info in self._obj_types:
+            if type_info.constructor and any(
+                self._plan_depends_on(dependency, dependency_type, obj_types, removed)
+                for _, dependency, dependency_type in type_info.constructor
+            ):
+                type_info.constructor = None
+                invalidated.append(type_info)
+        return invalidated
+
+    def _plan_depends_on(self, dependency, dependency_type, obj_types, removed):
+        if dependency.is_config:
+            return False
+        if removed:
+            if isinstance(dependency_type, dict):
+                dependency_type = list(dependency_type.values())
+            elif not isinstance(dependency_type, list):
+                dependency_type = [dependency_type]
+            return any(t in removed for t in dependency_type)
+        if dependency.name:
+            # Names resolve to a single registration, which may be one of the new types.
+            return any(
+                self._registered_name(t) == dependency.name for t in self._obj_types if t.obj_type in obj_types
+            )
+        # New types may be resolved instead, or along with the current ones.
+        return any(issubclass(obj_type, dependency.type) for obj_type in obj_types)
+
+    def _after_fork(self):
+        """
+        Called in the child process after a fork. Singletons which are not fork safe
+        are dropped to be created again on demand, along with the singletons which
+        received them through their constructor, the balancers and the wired fields
+        holding any of them. Dropped singletons are kept referenced, so their
+        destructors don't close resources still in use by the parent process.
+        """
+        dropped = {}
+        for type_info in self._constructor_dependents(list(self._fork_unsafe_singletons.values())):
+            instance = self._singletons.pop(type_info.obj_type, None)
+            if instance is not None:
+                dropped[id(instance)] = instance
+        self._forked_singletons.extend(dropped.values())
+        self._fork_unsafe_singletons.clear()
+        self._balancers = {}
+        if dropped:
+            for obj in list(self._wired):
+                wired = object.__getattribute__(obj, "__pyoc_wired__")
+                for name in [name for name, value in wired.items() if _holds(value, dropped)]:
+                    # Resolved through the context from now on.
+                    del wired[name]
+        # Worker threads don't survive the fork, the pool is created again on demand.
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._balancers_lock = threading.RLock()
+        self._config._after_fork()
+        if self._memory is not None:
+            self._memory._after_fork()
+        if self._process_dispatcher is not None:
+            # Worker processes belong to the parent.
+            self._process_dispatcher = self._process_dispatcher.copy()
+
+    def _index_type(self, type_info):
+        for tag in type_info.tags:
+            if type_info not in self._obj_type_tag_dict[tag]:
+                self._obj_type_tag_dict[tag].append(type_info)
+        if type_info.qualifier is not None:
+            for obj_type in type_info.obj_type.__mro__[:-1]:
+                self._obj_type_qualifier_dict.setdefault((obj_type, type_info.qualifier), type_info)
+
+    def _invalidate_caches(self):
+        self._type_cache.clear()
+        self._expr_cache.clear()
 
     def _make_class_dict(self, obj_type):
         """
@@ -222,60 +884,197 @@ class Context:
             # Workaround for Flask endpoints, the "as_view" doesn't respect the processed class
             # Will figure out a better solution later.
             k != "as_view"
+            # Instance layout members, the subclass gets its own.
+            and k not in ("__slots__", "__dict__", "__weakref__")
         }
 
+    def _slot_names(self, obj_type):
+        """
+        Returns the slots of a class whose instances have no __dict__, None if they have one.
+        """
+        names = set()
+        for cls in obj_type.__mro__[:-1]:
+            slots = cls.__dict__.get("__slots__")
+            if slots is None:
+                return None
+            names.update([slots] if isinstance(slots, str) else slots)
+        return names
+
     def _is_list_type(self, attr):
         return isinstance(attr, typing._GenericAlias) and attr._name == "List"
 
     def _is_mapping_type(self, attr):
         return isinstance(attr, typing._GenericAlias) and attr._name == "Mapping"
 
-    def _resolve_attr(self, obj, obj_type, attr_name):
+    def _is_iterable_type(self, attr):
+        return isinstance(attr, typing._GenericAlias) and attr._name == "Iterable"
+
+    def _is_iterator_type(self, attr):
+        return isinstance(attr, typing._GenericAlias) and attr._name == "Iterator"
+
+    def _is_provider_type(self, attr):
+        return isinstance(attr, typing._GenericAlias) and attr.__origin__ is Provider
+
+    def _is_balanced_type(self, attr):
+        return isinstance(attr, typing._GenericAlias) and attr.__origin__ is Balanced
 
+    def _make_dependency(self, annotation):
+        """
+        Translates a type hint into a dependency, or None if the hint
+        does not describe something the context can inject.
+        """
+        if inspect.isclass(annotation):
+            return Dependency(None, annotation)
+        elif self._is_list_type(annotation):
+            arg_types = annotation.__args__
+            if arg_types:
+                return Dependency(None, arg_types[0], Dependency.LIST)
+        elif self._is_mapping_type(annotation):
+            arg_types = annotation.__args__
+            if arg_types:
+                _, val_type = arg_types
+                return Dependency(None, val_type, Dependency.MAPPING)
+        elif self._is_iterable_type(annotation):
+            arg_types = annotation.__args__
+            if arg_types:
+                return Dependency(None, arg_types[0], Dependency.ITERABLE)
+        elif self._is_iterator_type(annotation):
+            arg_types = annotation.__args__
+            if arg_types:
+                return Dependency(None, arg_types[0], Dependency.ITERATOR)
+        elif self._is_provider_type(annotation):
+            arg_types = annotation.__args__
+            if arg_types:
+                return Dependency(None, arg_types[0], Dependency.PROVIDER)
+        elif self._is_balanced_type(annotation):
+            arg_types = annotation.__args__
+            if arg_types:
+                return Dependency(None, arg_types[0], Dependency.BALANCED)
+        return None
+
+    def _find_field_dependencies(self, obj_type):
+        """
+        Dependencies declared as annotated fields. Fields also received through
+        the constructor are left to it.
+        """
+        constructor_params = self._constructor_params(obj_type)
         annotations = obj_type.__dict__.get("__annotations__", {})
+        dependencies = {}
+        for name, annotation in annotations.items():
+            if name in constructor_params:
+                continue
+            default = obj_type.__dict__.get(name)
+            # A ref or Value given as default describes the field better than its annotation.
+            dependency = default if isinstance(default, Dependency) else self._make_dependency(annotation)
+            if dependency:
+                dependencies[name] = dependency
+        return dependencies
+
+    def _constructor_params(self, obj_type):
+        """
+        Returns the type hinted parameters of the class constructor, excluding self.
+        """
+        init = obj_type.__init__
+        if not inspect.isfunction(init):
+            return {}
+        try:
+            hints = typing.get_type_hints(init)
+        except Exception:
+            # Forward references to local classes can't be evaluated, use raw hints.
+            hints = getattr(init, "__annotations__", {})
+        parameters = list(inspect.signature(init).parameters.values())[1:]
+        return {
+            p.name: (hints.get(p.name), p)
+            for p in parameters
+            if (p.name in hints or isinstance(p.default, Dependency))
+            and p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)
+        }
 
-        annotation = annotations.get(attr_name)
-        if annotation:
-            if inspect.isclass(annotation):
-                return Dependency(None, annotation)
-            elif self._is_list_type(annotation):
-                arg_types = annotation.__args__
-                if arg_types:
-                    return Dependency(None, arg_types[0], Dependency.LIST)
-            elif self._is_mapping_type(annotation):
-                arg_types = annotation.__args__
-                if arg_types:
-                    _, val_type = arg_types
-                    return Dependency(None, val_type, Dependency.MAPPING)
-
-        # not using getattr since will cause stack overflow
-        attr = obj_type.__getattribute__(obj, attr_name)
-
-        return attr
+    def _compile_constructor(self, obj_type):
+        """
+        Resolves the constructor parameters of a class into a list of
+        (name, dependency, dependency type) entries, used to create instances
+        without looking up types again.
+        """
+        plan = []
+        for name, (annotation, parameter) in self._constructor_params(obj_type).items():
+            if isinstance(parameter.default, Dependency):
+                # Like a Value default, resolved instead of passed as is.
+                dependency = parameter.default
+            else:
+                dependency = self._make_dependency(annotation)
+            dependency_type = self._resolve_dependency_type(dependency) if dependency else None
+            if dependency_type is None:
+                if parameter.default is dependency:
+                    raise DependencyError(dependency.name or dependency.type, name)
+                if parameter.default is parameter.empty:
+                    raise DependencyError(annotation, name)
+                continue
+            plan.append((name, dependency, dependency_type))
+        return plan
 
     def _process_type(self, obj_type):
+        """
+        Returns the processed type for a class and the wrappers of this context, shared
+        with other contexts with the same configuration.
+        """
+        wrapper_infos = self._find_wrappers(obj_type)
+        key = (obj_type, tuple((wi.method_expr, wi.wrapper_type) for wi in wrapper_infos))
+
+        with _processed_types_lock:
+            processed_type = _processed_types.get(key)
+            if processed_type is None:
+                processed_type = _processed_types[key] = self._make_processed_type(obj_type, wrapper_infos)
+        return processed_type
+
+    def _make_processed_type(self, obj_type, wrapper_infos):
+        """
+        Creates a subclass which resolves dependencies and wraps methods. It must not
+        reference this context, objects find theirs in __pyoc_context__.
+        """
         class_dict = self._make_class_dict(obj_type)
+        dependencies = self._find_field_dependencies(obj_type)
+        slot_names = self._slot_names(obj_type)
+        slot_dependencies = {name: d for name, d in dependencies.items() if slot_names and name in slot_names}
+        for name in slot_dependencies:
+            del dependencies[name]
 
         def _getattr(obj, attr):
-            result = self._resolve_attr(obj, obj_type, attr)
+            result = dependencies.get(attr)
+            if result is None:
+                # not using getattr since will cause stack overflow
+                result = obj_type.__getattribute__(obj, attr)
             if isinstance(result, Dependency):
-                dependency_type = self._resolve_dependency_type(result)
-                if dependency_type is None:
-                    raise DependencyError(result._type, attr)
-                return self._instantiate_dependency(result, dependency_type)
+                try:
+                    wired = obj_type.__getattribute__(obj, "__pyoc_wired__")
+                except AttributeError:
+                    # Unset slot, the object was created by someone else.
+                    wired = None
+                if wired is not None and attr in wired:
+                    return wired[attr]
+                return _context_of(obj)._resolve(result, attr, obj_type)
             else:
                 if inspect.ismethod(result):
-                    wrapper_types = getattr(obj, "__wrapper_types").get(attr)
+                    wrapper_types = obj_type.__getattribute__(obj, "__wrapper_types").get(attr)
 
                     if wrapper_types:
-                        wrapper = getattr(obj, "__wrappers").get(attr)
+                        try:
+                            wrappers = obj_type.__getattribute__(obj, "__pyoc_wrappers__")
+                        except AttributeError:
+                            wrappers = None
+                        if wrappers is None:
+                            wrappers = {}
+                            object.__setattr__(obj, "__pyoc_wrappers__", wrappers)
+
+                        wrapper = wrappers.get(attr)
 
                         if not wrapper:
-                            wrapper = WrapperChain(result)
+                            ctx = _context_of(obj)
+                            wrapper = WrapperChain(result, ctx)
 
                             for wrapper_type in wrapper_types:
-                                wrapper.add(self.new(wrapper_type, wrapper))
-                            getattr(obj, "__wrappers")[attr] = wrapper
+                                wrapper.add(ctx.new(wrapper_type, wrapper))
+                            wrapper = wrappers[attr] = wrapper.weave()
 
                         return wrapper
             return result
@@ -283,17 +1082,31 @@ class Context:
         wrapper_types = defaultdict(list)
         new_members = {}
 
-        wrapper_infos = self._find_wrappers(obj_type)
-
         for name, member in class_dict.items():
             if self._hasattr(member, "_dependency"):
-                new_members[name] = DependencyResolver(self, member, member._dependency)
+                new_members[name] = DependencyResolver(obj_type, member, member._dependency)
             elif inspect.isfunction(member):
                 wrapper_types[name] += [wi.wrapper_type for wi in wrapper_infos if wi.matches(name)]
+                check_chain(member, wrapper_types[name])
 
         class_dict.update(new_members)
-        class_dict["__getattribute__"] = _getattr
-        class_dict["__wrappers"] = {}
+        dependencies.update((name, member) for name, member in class_dict.items() if isinstance(member, Dependency))
+        if (
+            dependencies
+            or any(wrapper_types.values())
+            or any(isinstance(member, DependencyResolver) for member in class_dict.values())
+        ):
+            # Classes with nothing to resolve keep the native attribute lookup.
+            class_dict["__getattribute__"] = _getattr
+        if slot_names is None:
+            class_dict["__pyoc_context__"] = None
+            class_dict["__pyoc_wrappers__"] = None
+            class_dict["__pyoc_wired__"] = None
+        else:
+            # Keep instances without __dict__.
+            class_dict["__slots__"] = ("__pyoc_context__", "__pyoc_wrappers__", "__pyoc_wired__")
+        class_dict["__pyoc_dependencies__"] = dependencies
+        class_dict["__pyoc_slot_dependencies__"] = slot_dependencies
         class_dict["__wrapper_types"] = wrapper_types
         class_dict["__class__"] = obj_type
 
@@ -312,13 +1125,26 @@ class Context:
         return obj
 
     def _hasattr(self, member, name):
-        return not isinstance(member, MagicMock) and hasattr(member, name)
+        return not self._is_mock(member) and hasattr(member, name)
+
+    def _is_mock(self, member):
+        """
+        Mocks pretend to have any attribute. They can only exist if a mock library
+        was already imported, so there is no need to import one here.
+        """
+        for module_name in ("unittest.mock", "mock.mock"):
+            module = sys.modules.get(module_name)
+            if module is not None and isinstance(member, module.NonCallableMock):
+                return True
+        return False
 
     def _resolve_dependency_type(self, dependency):
+        if dependency.is_config:
+            return self._config
         if dependency.name:
-            return self._obj_type_name_dict[dependency.name]
+            return self._obj_type_name_dict.get(dependency.name)
         elif dependency.type:
-            if dependency.list_of_type:
+            if dependency.list_of_type or dependency.is_iterable or dependency.is_iterator or dependency.is_balanced:
                 return self._find_types(dependency.type)
             elif dependency.is_mapping:
                 return {t.name: t for t in self._find_types(dependency.type) if t.name}
@@ -326,18 +1152,19 @@ class Context:
         return None
 
     def _find_type(self, obj_type):
-        try:
-            return next(self._do_find_types(obj_type))
-        except StopIteration:
-            return None
+        types = self._find_types(obj_type)
+        return types[0] if types else None
 
     def _find_types(self, obj_type):
-        return list(self._do_find_types(obj_type))
+        types = self._type_cache.get(obj_type)
+        if types is None:
+            types = self._type_cache[obj_type] = list(self._do_find_types(obj_type))
+        return types
 
     def _do_find_types(self, obj_type):
         """
-        Using a generator for performance reasons. When I need just first type
-        I don't need to walk trough all the options.
+        Walks through all the registered types and factories, results are cached
+        by _find_types.
         """
         all_items = set()
         result = self._obj_type_dict.get(obj_type)
@@ -359,30 +1186,69 @@ class Context:
                     True,
                     factory.singleton,
                     FactoryProxy(self, factory.factory_function, obj_type),
+                    fork_safe=factory.fork_safe,
                 )
 
     def _find_type_by_expr(self, search_expr):
+        try:
+            return self._expr_cache[search_expr]
+        except (KeyError, TypeError):
+            pass
 
+        result = None
         for obj_type, actual_type in self._obj_type_dict.items():
             if search_expr(obj_type):
-                return actual_type
+                result = actual_type
+                break
 
-        return None
+        try:
+            self._expr_cache[search_expr] = result
+        except TypeError:
+            # Callables without weak references support aren't cached.
+            pass
+        return result
 
     def _find_wrappers(self, obj_type):
         return [wrapper for wrapper in self._wrappers if wrapper.valid_for_class(obj_type)]
 
 
+def _holds(value, instances):
+    """
+    Whether a resolved dependency is, or contains, one of the instances, by id.
+    """
+    if isinstance(value, LazyMapping):
+        # Keeps the objects already read.
+        value = list(value._instances.values())
+    if isinstance(value, (list, tuple)):
+        return any(id(item) in instances for item in value)
+    return id(value) in instances
+
+
+def _context_of(obj):
+    try:
+        ctx = object.__getattribute__(obj, "__pyoc_context__")
+    except AttributeError:
+        ctx = None
+    if ctx is None:
+        raise DependencyError(f"{obj.__class__.__name__} object was not created by a context")
+    return ctx
+
+
 class DependencyResolver:
-    def __init__(self, ctx, member, dependency):
-        self._ctx = ctx
+    """
+    Replaces methods decorated with ref, returns a callable which resolves the
+    dependency through the context of the object.
+    """
+
+    def __init__(self, obj_type, member, dependency):
+        self._obj_type = obj_type
         self._member = member
         self._dependency = dependency
-        self._instance = None
 
-    def __call__(self, *args, **kwargs):
-        dependency_type = self._ctx._resolve_dependency_type(self._dependency)
-        return self._ctx._instantiate_dependency(self._dependency, dependency_type)
+    def __get__(self, obj, obj_type=None):
+        if obj is None:
+            return self
+        return functools.partial(_context_of(obj)._resolve, self._dependency, self._member.__name__, self._obj_type)
 
 
 class TypeDefinition:
@@ -390,10 +1256,17 @@ class TypeDefinition:
     Holds information about a given registered type.
     """
 
-    def __init__(self, obj_type, name, lazy, singleton, factory):
+    def __init__(self, obj_type, name, lazy, singleton, factory, tags=None, qualifier=None, fork_safe=True):
         self.obj_type = obj_type
         self.name = name
+        self.tags = tuple(tags or ())
+        self.qualifier = qualifier
+        self.fork_safe = fork_safe
+        self.constructed = False
+        self.processed = False
         self.processed_type = None
         self.lazy = lazy
         self.singleton = singleton
         self.factory = factory
+        self.constructor = None
+        self.config_keys = set()
@@ -1,2 +1,6 @@
 class DependencyError(Exception):
     pass
+
+
+class WrapperError(Exception):
+    pass
@@ -3,10 +3,11 @@ class FactoryDefinition:
     Holds information about a given object factory.
     """
 
-    def __init__(self, type_selector, factory_function, singleton):
+    def __init__(self, type_selector, factory_function, singleton, fork_safe=True):
         self._type_selector = type_selector
         self._factory_function = factory_function
         self._singleton = singleton
+        self._fork_safe = fork_safe
 
     def can_create(self, obj_type):
         return self._type_selector(obj_type)
@@ -19,6 +20,10 @@ class FactoryDefinition:
     def singleton(self):
         return self._singleton
 
+    @property
+    def fork_safe(self):
+        return self._fork_safe
+
 
 class FactoryProxy:
     """
@@ -1,12 +1,123 @@
+import json
+import queue
+import threading
+from collections.abc import Iterator
 from .context import Context
 import flask
 import flask_restful
 
 
+class EndpointStats:
+    """
+    Counters of an endpoint registered with a pool of resource instances.
+    """
+
+    def __init__(self, endpoint: str, pool_size: int):
+        self.endpoint = endpoint
+        self.pool_size = pool_size
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.pool_waits = 0
+        self._lock = threading.Lock()
+
+    def to_dict(self):
+        return {
+            "endpoint": self.endpoint,
+            "pool_size": self.pool_size,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "pool_waits": self.pool_waits,
+        }
+
+
+class _ResourcePool:
+    """
+    Pre-wired instances of a resource, shared by requests. Each request takes one
+    instance and gives it back when done, waiting if all of them are in use.
+    """
+
+    def __init__(self, context: Context, resource, size: int, stats: EndpointStats, args=(), kwargs=None):
+        self._instances = queue.LifoQueue()
+        self._stats = stats
+        for _ in range(size):
+            instance = context.wire(context.new(resource, *args, **(kwargs or {})))
+            self._instances.put((instance, self._bound_methods(instance)))
+
+    @staticmethod
+    def _bound_methods(instance):
+        if instance.method_decorators or instance.representations:
+            # Decorators and representations are applied by dispatch_request.
+            return None
+        methods = {method: getattr(instance, method.lower()) for method in instance.methods}
+        if "GET" in methods:
+            methods.setdefault("HEAD", methods["GET"])
+        return methods
+
+    def dispatch(self, *args, **kwargs):
+        stats = self._stats
+        try:
+            entry = self._instances.get_nowait()
+            waited = False
+        except queue.Empty:
+            waited = True
+        with stats._lock:
+            stats.requests += 1
+            stats.in_flight += 1
+            stats.pool_waits += waited
+        if waited:
+            entry = self._instances.get()
+
+        instance, methods = entry
+        try:
+            if methods is None:
+                return instance.dispatch_request(*args, **kwargs)
+            method = methods.get(flask.request.method)
+            if method is None:
+                return instance.dispatch_request(*args, **kwargs)
+            return method(*args, **kwargs)
+        except BaseException:
+            with stats._lock:
+                stats.errors += 1
+            raise
+        finally:
+            self._instances.put(entry)
+            with stats._lock:
+                stats.in_flight -= 1
+
+
+class _Api(flask_restful.Api):
+    """
+    Streams iterator results, like the ones of generator methods, as a chunked JSON
+    array, so they aren't held in memory.
+    """
+
+    def make_response(self, data, *args, **kwargs):
+        if isinstance(data, Iterator):
+            return flask.Response(
+                flask.stream_with_context(_json_chunks(data)),
+                args[0] if args else 200,
+                kwargs.get("headers"),
+                mimetype="application/json",
+            )
+        return super().make_response(data, *args, **kwargs)
+
+
+def _json_chunks(items):
+    settings = flask.current_app.config.get("RESTFUL_JSON", {})
+    separator = "["
+    for item in items:
+        yield separator + json.dumps(item, **settings)
+        separator = ","
+    yield "[]\n" if separator == "[" else "]\n"
+
+
 class BluePrint(flask.Blueprint):
     """
     IOC support for Flask resources. Additionally, this class will add a field "app_context"
     to request objects.
+    Resources may return iterators, like generators, which are streamed as JSON arrays.
     """
 
     def __init__(self, name: str, import_name: str, url_prefix: str, context: Context):
@@ -20,19 +131,66 @@ class BluePrint(flask.Blueprint):
         """
         super().__init__(name, import_name, url_prefix=url_prefix)
         self._context = context
-        self._api = flask_restful.Api(self)
+        self._api = _Api(self)
         self._api.app_context = context
+        self._endpoint_stats = {}
         self.before_request(self._before_request)
 
-    def add_endpoint(self, resource, *path_list, **kwargs):
+    @property
+    def endpoint_stats(self):
+        """
+        Counters of the endpoints added with a pool of instances, by endpoint name.
+        """
+        return dict(self._endpoint_stats)
+
+    def add_endpoint(self, resource, *path_list, pool_size: int = 0, **kwargs):
         """
         Adds a resource. It processes the resource through the context to resolve references.
         Parameters:
             resource: The resource
             path_list: Paths associated to the resource
-            kwargs: ... etc.
+            pool_size: When greater than 0, that many instances of the resource are created
+                up front with their dependencies resolved, and reused by all requests
+                instead of creating an instance per request. The resource must not keep
+                request state in its fields.
+            kwargs: ... etc. With a pool, resource_class_args and resource_class_kwargs are given
+                to the pooled instances.
         """
-        self._api.add_resource(self._context.process(resource), *path_list, **kwargs)
+        resource_type = self._context.process(resource)
+        if pool_size > 0:
+            endpoint = kwargs.setdefault("endpoint", resource_type.__name__.lower())
+            stats = self._endpoint_stats[endpoint] = EndpointStats(endpoint, pool_size)
+            # Given to the pooled instances, instead of to an instance per request.
+            pool = _ResourcePool(
+                self._context,
+                resource,
+                pool_size,
+                stats,
+                kwargs.pop("resource_class_args", ()),
+                kwargs.pop("resource_class_kwargs", None),
+            )
+            resource_type = _pooled(resource_type, pool)
+        self._api.add_resource(resource_type, *path_list, **kwargs)
 
     def _before_request(self):
         flask.request.app_context = self._context
+
+
+def _pooled(resource_type, pool):
+    """
+    Subclass of a resource type whose views dispatch requests to the instances of a pool.
+    """
+
+    def as_view(cls, name, *class_args, **class_kwargs):
+        def view(*args, **kwargs):
+            return pool.dispatch(*args, **kwargs)
+
+        view.view_class = cls
+        view.__name__ = name
+        view.__doc__ = cls.__doc__
+        view.__module__ = cls.__module__
+        view.methods = cls.methods
+        view.provide_automatic_options = cls.provide_automatic_options
+        return view
+
+    return type(resource_type.__name__, (resource_type,), {"__slots__": (), "as_view": classmethod(as_view)})
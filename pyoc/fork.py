@@ -0,0 +1,32 @@
+import os
+import weakref
+
+_contexts = weakref.WeakSet()
+_callbacks = []
+
+
+def register(ctx):
+    """
+    Registers a context to be notified when the process forks.
+    """
+    _contexts.add(ctx)
+
+
+def on_fork(callback):
+    """
+    Registers a function called in the child process after a fork, before the contexts
+    are notified, like one creating module level locks again.
+    """
+    _callbacks.append(callback)
+    return callback
+
+
+def _after_fork_in_child():
+    for callback in _callbacks:
+        callback()
+    for ctx in list(_contexts):
+        ctx._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,53 @@
+from collections.abc import Mapping
+
+
+class LazyIterable:
+    """
+    Injected for Iterable[T] and Iterator[T] hints, instantiates the objects
+    of the matching types only while being iterated.
+    """
+
+    def __init__(self, ctx, dependency, type_infos):
+        self._ctx = ctx
+        self._dependency = dependency
+        self._type_infos = type_infos
+
+    def __iter__(self):
+        for type_info in self._type_infos:
+            yield self._ctx._instantiate_dependency(self._dependency, type_info)
+
+    def __str__(self):
+        return f"LazyIterable({self._dependency})"  # pragma: no cover
+
+
+class LazyMapping(Mapping):
+    """
+    Injected for Mapping[str, T] hints. Objects are instantiated when their key is
+    read for the first time, and kept for the lifetime of the mapping.
+    """
+
+    def __init__(self, ctx, dependency, type_infos):
+        self._ctx = ctx
+        self._dependency = dependency
+        self._type_infos = type_infos
+        self._instances = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._instances[key]
+        except KeyError:
+            instance = self._ctx._instantiate_dependency(self._dependency, self._type_infos[key])
+            self._instances[key] = instance
+            return instance
+
+    def __iter__(self):
+        return iter(self._type_infos)
+
+    def __len__(self):
+        return len(self._type_infos)
+
+    def __contains__(self, key):
+        return key in self._type_infos
+
+    def __str__(self):
+        return f"LazyMapping({self._dependency})"  # pragma: no cover
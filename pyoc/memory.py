@@ -0,0 +1,170 @@
+import sys
+import threading
+import weakref
+
+
+class TypeMemory:
+    """
+    Live instances of a registered type in a scope, "singleton" or "prototype",
+    along with their approximate size, sampled at creation.
+    """
+
+    def __init__(self, name, scope, live=0, peak=0, created=0, untracked=0, sampled_size=0, samples=0):
+        self.name = name
+        self.scope = scope
+        self.live = live
+        self.peak = peak
+        self.created = created
+        # Instances which don't support weak references, they are counted as created only.
+        self.untracked = untracked
+        self.sampled_size = sampled_size
+        self.samples = samples
+
+    @property
+    def average_size(self) -> float:
+        return self.sampled_size / self.samples if self.samples else 0.0
+
+    @property
+    def estimated_size(self) -> float:
+        """
+        Approximate bytes held by the live instances, not counting what they reference.
+        """
+        return self.live * self.average_size
+
+    def copy(self):
+        return TypeMemory(
+            self.name, self.scope, self.live, self.peak, self.created, self.untracked, self.sampled_size, self.samples
+        )
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "scope": self.scope,
+            "live": self.live,
+            "peak": self.peak,
+            "created": self.created,
+            "untracked": self.untracked,
+            "average_size": self.average_size,
+            "estimated_size": self.estimated_size,
+        }
+
+
+class MemoryTracker:
+    """
+    Counts the live instances created by a context with weak references, per type
+    and scope. The size of one in every sample_every instances is measured.
+    """
+
+    def __init__(self, sample_every: int = 16):
+        self.sample_every = max(sample_every, 1)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def track(self, type_info, obj):
+        scope = "singleton" if type_info.singleton else "prototype"
+        key = (type_info.obj_type, scope)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                obj_type = type_info.obj_type
+                entry = self._entries[key] = TypeMemory(f"{obj_type.__module__}.{obj_type.__qualname__}", scope)
+            sample = entry.created % self.sample_every == 0
+            entry.created += 1
+
+        try:
+            weakref.finalize(obj, self._collected, entry)
+        except TypeError:
+            with self._lock:
+                entry.untracked += 1
+            return
+
+        size = _size_of(obj) if sample else 0
+        with self._lock:
+            entry.live += 1
+            entry.peak = max(entry.peak, entry.live)
+            if sample:
+                entry.sampled_size += size
+                entry.samples += 1
+
+    def _collected(self, entry):
+        with self._lock:
+            entry.live -= 1
+
+    def snapshot(self) -> "MemoryReport":
+        with self._lock:
+            return MemoryReport([entry.copy() for entry in self._entries.values()])
+
+
+class MemoryReport:
+    """
+    Snapshot of the live instances of a context, see Context.memory_report.
+    """
+
+    def __init__(self, entries):
+        self._entries = sorted(entries, key=lambda entry: entry.estimated_size, reverse=True)
+
+    @property
+    def entries(self):
+        return list(self._entries)
+
+    @property
+    def total_size(self) -> float:
+        return sum(entry.estimated_size for entry in self._entries)
+
+    def get(self, name: str, scope: str = "prototype") -> TypeMemory:
+        for entry in self._entries:
+            if entry.scope == scope and (entry.name == name or entry.name.endswith(f".{name}")):
+                return entry
+        return None
+
+    def diff(self, previous: "MemoryReport") -> "MemoryReport":
+        """
+        Returns the growth since a previous snapshot: live instances, created instances
+        and sizes are differences, peaks are the ones of this snapshot. Types which
+        didn't change are left out.
+        """
+        before = {(entry.name, entry.scope): entry for entry in previous._entries}
+        entries = []
+        for entry in self._entries:
+            old = before.get((entry.name, entry.scope)) or TypeMemory(entry.name, entry.scope)
+            if entry.live == old.live and entry.created == old.created:
+                continue
+            delta = TypeMemory(
+                entry.name,
+                entry.scope,
+                entry.live - old.live,
+                entry.peak,
+                entry.created - old.created,
+                entry.untracked - old.untracked,
+                entry.sampled_size,
+                entry.samples,
+            )
+            entries.append(delta)
+        return MemoryReport(entries)
+
+    def to_dict(self):
+        return {"total_size": self.total_size, "types": [entry.to_dict() for entry in self._entries]}
+
+    def to_text(self) -> str:
+        """
+        One line per type and scope, the largest first.
+        """
+        return "\n".join(
+            f"{entry.name} [{entry.scope}] live {entry.live} (peak {entry.peak}, created {entry.created}) "
+            f"~{entry.estimated_size / 1024:.1f}KiB"
+            for entry in self._entries
+        )
+
+
+def _size_of(obj):
+    """
+    Shallow size of an object and its attribute dictionary.
+    """
+    size = sys.getsizeof(obj)
+    attributes = getattr(obj, "__dict__", None)
+    if isinstance(attributes, dict):
+        size += sys.getsizeof(attributes)
+    return size
@@ -0,0 +1,22 @@
+import asyncio
+import contextvars
+from .wrapper import Wrapper
+
+
+class OffloadWrapper(Wrapper):
+    """
+    Runs the wrapped method in the thread pool of the context, and returns a
+    concurrent.futures.Future with its result, or an awaitable when called with
+    an event loop running. Context variables set by the caller are visible to the
+    method, as it runs in a copy of the caller context.
+
+        ctx.wrap(ProfileServiceImpl, "fetch_.*", pyoc.OffloadWrapper)
+    """
+
+    def __call__(self, *args, **kwargs):
+        future = self.context.executor.submit(contextvars.copy_context().run, self.next, *args, **kwargs)
+
+        loop = asyncio._get_running_loop()
+        if loop is not None:
+            return asyncio.wrap_future(future, loop=loop)
+        return future
@@ -0,0 +1,179 @@
+import asyncio
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from .wrapper import Wrapper
+
+# Context of the current worker process, None outside of workers.
+_worker_context = None
+
+
+def _init_worker(spec):
+    global _worker_context
+    _worker_context = spec()
+
+
+def _invoke(obj_type, method_name, args, kwargs):
+    result = getattr(_worker_context.get(obj_type), method_name)(*args, **kwargs)
+
+    for arg in itertools.chain(args, kwargs.values()):
+        if isinstance(arg, SharedBuffer) and arg is not result:
+            arg.close()
+    if isinstance(result, SharedBuffer):
+        # The memory is released by the caller, closing only unmaps it here.
+        result.close()
+    return result
+
+
+def _invoke_chunk(obj_type, method_name, chunk):
+    return [_invoke(obj_type, method_name, args, {}) for args in chunk]
+
+
+class ProcessDispatcher:
+    """
+    Runs methods of context objects in a pool of worker processes. Each worker builds
+    its own context by calling spec, which must be a picklable callable, like a module
+    level function, returning a built context. Calls are routed by type and method name,
+    so arguments and results must be picklable but the objects don't need to be.
+    """
+
+    def __init__(self, spec, max_workers: int = None, mp_context=None):
+        self._spec = spec
+        self._max_workers = max_workers
+        self._mp_context = mp_context
+        self._executor = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Workers must share the resource tracker, so shared memory they create
+            # isn't destroyed when they exit.
+            resource_tracker.ensure_running()
+            self._executor = ProcessPoolExecutor(
+                self._max_workers, self._mp_context, initializer=_init_worker, initargs=(self._spec,)
+            )
+        return self._executor
+
+    def submit(self, obj_type, method_name: str, *args, **kwargs):
+        """
+        Invokes a method of the object of a given type in a worker process, returns a future.
+        """
+        return self.executor.submit(_invoke, obj_type, method_name, args, kwargs)
+
+    def map(self, obj_type, method_name: str, *iterables, chunksize: int = 1):
+        """
+        Like the builtin map, invokes a method once for each group of arguments taken
+        from the iterables. Arguments are sent to workers in chunks of chunksize calls,
+        results are returned in order.
+        """
+        args = zip(*iterables)
+        futures = []
+        while True:
+            chunk = list(itertools.islice(args, chunksize))
+            if not chunk:
+                break
+            futures.append(self.executor.submit(_invoke_chunk, obj_type, method_name, chunk))
+
+        for future in futures:
+            yield from future.result()
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait)
+            self._executor = None
+
+    def copy(self):
+        """
+        Returns a dispatcher with the same configuration and no worker processes.
+        """
+        return ProcessDispatcher(self._spec, self._max_workers, self._mp_context)
+
+
+class ProcessWrapper(Wrapper):
+    """
+    Runs the wrapped method in a worker process of the context process pool, configured
+    with Context.set_process_pool. Returns a concurrent.futures.Future, or an awaitable
+    when called with an event loop running.
+    The wrapped object type must be importable by workers, and the method is invoked
+    on the object of that type of the worker context.
+    """
+
+    def __call__(self, *args, **kwargs):
+        if _worker_context is not None:
+            # Already running in a worker.
+            return self.next(*args, **kwargs)
+
+        future = self.context.process_dispatcher.submit(
+            self.target.__self__.__class__, self.target.__name__, *args, **kwargs
+        )
+
+        loop = asyncio._get_running_loop()
+        if loop is not None:
+            return asyncio.wrap_future(future, loop=loop)
+        return future
+
+
+class SharedBuffer:
+    """
+    Bytes in shared memory. When passed to or returned from a worker process only
+    its name is sent, and the other process maps the same memory.
+    The process which creates the buffer, or receives it as result, must release it.
+    """
+
+    def __init__(self, shared_memory: SharedMemory, size: int):
+        self._shared_memory = shared_memory
+        self._size = size
+
+    @classmethod
+    def create(cls, size: int) -> "SharedBuffer":
+        return cls(SharedMemory(create=True, size=max(size, 1)), size)
+
+    @classmethod
+    def from_bytes(cls, data) -> "SharedBuffer":
+        buffer = cls.create(len(data))
+        buffer.buf[:] = data
+        return buffer
+
+    @property
+    def name(self) -> str:
+        return self._shared_memory.name
+
+    @property
+    def buf(self) -> memoryview:
+        return self._shared_memory.buf[: self._size]
+
+    def __len__(self):
+        return self._size
+
+    def tobytes(self) -> bytes:
+        return bytes(self.buf)
+
+    def close(self):
+        """
+        Unmaps the memory from this process.
+        """
+        self._shared_memory.close()
+
+    def release(self):
+        """
+        Unmaps and destroys the memory.
+        """
+        self._shared_memory.close()
+        try:
+            self._shared_memory.unlink()
+        except FileNotFoundError:  # pragma: no cover
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.release()
+
+    def __reduce__(self):
+        return _attach, (self.name, self._size)
+
+
+def _attach(name, size):
+    return SharedBuffer(SharedMemory(name=name), size)
@@ -0,0 +1,26 @@
+from typing import Generic, List, TypeVar
+
+T = TypeVar("T")
+
+
+class Provider(Generic[T]):
+    """
+    Creates objects of a given type on demand. Injected for Provider[T] type hints,
+    the type is resolved once when the provider is created.
+    """
+
+    def __init__(self, create):
+        self._create = create
+
+    def get(self) -> T:
+        """
+        Returns an object of the provided type, a new one unless it is a singleton.
+        """
+        return self._create()
+
+    def get_many(self, count: int) -> List[T]:
+        """
+        Returns a list with count objects of the provided type.
+        """
+        create = self._create
+        return [create() for _ in range(count)]
@@ -29,6 +29,11 @@ class Dependency:
     SIMPLE = 1
     LIST = 2
     MAPPING = 3
+    ITERABLE = 4
+    ITERATOR = 5
+    PROVIDER = 6
+    BALANCED = 7
+    CONFIG = 8
 
     def __init__(self, name=None, type=None, ref_type=SIMPLE):
         self._name = name
@@ -51,6 +56,26 @@ class Dependency:
     def is_mapping(self):
         return self._ref_type == self.MAPPING
 
+    @property
+    def is_iterable(self):
+        return self._ref_type == self.ITERABLE
+
+    @property
+    def is_iterator(self):
+        return self._ref_type == self.ITERATOR
+
+    @property
+    def is_provider(self):
+        return self._ref_type == self.PROVIDER
+
+    @property
+    def is_balanced(self):
+        return self._ref_type == self.BALANCED
+
+    @property
+    def is_config(self):
+        return self._ref_type == self.CONFIG
+
     def __call__(self, func, *args, **kwargs):
         func._dependency = self
         return func
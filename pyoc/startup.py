@@ -0,0 +1,203 @@
+import threading
+import time
+
+
+class ComponentRecord:
+    """
+    Startup costs of a registered type: time spent processing it when the context
+    was built, and time spent creating its first instance.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.process_time = 0.0
+        self.construct_time = 0.0
+        self.nested_time = 0.0
+        self.dependencies = []
+
+    @property
+    def own_time(self) -> float:
+        """
+        Time spent on this component alone, without creating its dependencies.
+        """
+        return self.process_time + self.construct_time - self.nested_time
+
+    def add_dependency(self, record):
+        if record is not self and record not in self.dependencies:
+            self.dependencies.append(record)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "process_time": self.process_time,
+            "construct_time": self.construct_time,
+            "own_time": self.own_time,
+            "dependencies": [dependency.name for dependency in self.dependencies],
+        }
+
+
+class StartupRecorder:
+    """
+    Records the startup costs of the types of a context, and which component
+    caused each other one to be created.
+    """
+
+    def __init__(self):
+        self.records = {}
+        # Types left out of the last build, see Context.build roots.
+        self.pruned = []
+        self._local = threading.local()
+
+    def record(self, obj_type) -> ComponentRecord:
+        record = self.records.get(obj_type)
+        if record is None:
+            record = self.records[obj_type] = ComponentRecord(_name(obj_type))
+        return record
+
+    def processed(self, obj_type, elapsed):
+        self.record(obj_type).process_time += elapsed
+
+    def construct(self, type_info, create):
+        """
+        Creates the first instance of a type through create, timing it.
+        """
+        stack = self._stack()
+        record = self.record(type_info.obj_type)
+        if stack:
+            stack[-1][0].add_dependency(record)
+
+        stack.append((record, True))
+        start = time.perf_counter()
+        try:
+            return create(type_info)
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            record.construct_time = elapsed
+            if stack and stack[-1][1]:
+                stack[-1][0].nested_time += elapsed
+            type_info.constructed = True
+
+    def requested(self, obj_type, create, *args):
+        """
+        Creates a dependency requested by an object of a given type, after it was
+        created, so obj_type is recorded as the component which caused it.
+        """
+        stack = self._stack()
+        stack.append((self.record(obj_type), False))
+        try:
+            return create(*args)
+        finally:
+            stack.pop()
+
+    def report(self) -> "StartupReport":
+        return StartupReport(list(self.records.values()), [_name(obj_type) for obj_type in self.pruned])
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+class StartupReport:
+    """
+    Startup costs of the components of a context. The critical path is the chain
+    of dependencies with the highest cost, which gates the context readiness.
+    """
+
+    def __init__(self, records, pruned=()):
+        self._records = records
+        self._pruned = list(pruned)
+        self._costs = {}
+
+    @property
+    def components(self):
+        return list(self._records)
+
+    @property
+    def pruned(self):
+        """
+        Names of the registered types left out of the last build because no root reaches them.
+        """
+        return list(self._pruned)
+
+    @property
+    def total_time(self) -> float:
+        return sum(record.own_time for record in self._records)
+
+    def critical_path(self):
+        """
+        Returns the list of records of the most expensive chain of dependencies.
+        """
+        roots = self._roots()
+        if not roots:
+            return []
+        path = []
+        record = max(roots, key=self._cost)
+        while record is not None:
+            path.append(record)
+            record = max(record.dependencies, key=self._cost) if record.dependencies else None
+            if record in path:
+                break
+        return path
+
+    def to_dict(self):
+        return {
+            "total_time": self.total_time,
+            "critical_path": [record.name for record in self.critical_path()],
+            "components": [record.to_dict() for record in self._records],
+            "pruned": self.pruned,
+        }
+
+    def to_json(self, **kwargs) -> str:
+        import json
+
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_text(self) -> str:
+        """
+        Dependency tree of the components, sorted by cost, components in the
+        critical path are marked with "*".
+        """
+        critical_path = set(self.critical_path())
+        lines = []
+
+        def _add(record, depth, visited):
+            marker = "*" if record in critical_path else " "
+            lines.append(
+                f"{marker} {'  ' * depth}{record.name} "
+                f"{self._cost(record) * 1000:.3f}ms (own {record.own_time * 1000:.3f}ms)"
+            )
+            if record in visited:
+                return
+            visited = visited | {record}
+            for dependency in sorted(record.dependencies, key=self._cost, reverse=True):
+                _add(dependency, depth + 1, visited)
+
+        for root in sorted(self._roots(), key=self._cost, reverse=True):
+            _add(root, 0, frozenset())
+        if self._pruned:
+            lines.append(f"pruned: {', '.join(self._pruned)}")
+        return "\n".join(lines)
+
+    def _roots(self):
+        dependencies = {dependency for record in self._records for dependency in record.dependencies}
+        roots = [record for record in self._records if record not in dependencies]
+        # Components depending on each other only, pick any of them.
+        return roots or self._records[:1]
+
+    def _cost(self, record, visiting=frozenset()):
+        """
+        Own time of a component plus the cost of its most expensive dependency.
+        """
+        if record not in self._costs:
+            visiting = visiting | {record}
+            self._costs[record] = record.own_time + max(
+                (self._cost(d, visiting) for d in record.dependencies if d not in visiting), default=0.0
+            )
+        return self._costs[record]
+
+
+def _name(obj_type):
+    return f"{obj_type.__module__}.{obj_type.__qualname__}"
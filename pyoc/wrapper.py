@@ -1,6 +1,9 @@
 from typing import Callable
 from abc import ABCMeta, abstractmethod
+import functools
+import inspect
 import re
+from .exceptions import WrapperError
 
 
 class WrapperDefinition:
@@ -16,6 +19,10 @@ class WrapperDefinition:
     def valid_for_class(self, obj_type):
         return obj_type == self._obj_type or issubclass(obj_type, self._obj_type)
 
+    @property
+    def method_expr(self):
+        return self._method_expr
+
     def matches(self, method_name):
         return self._method_expr == method_name or re.match(self._method_expr, method_name) is not None
 
@@ -30,25 +37,90 @@ class WrapperChain:
     Order of wrappers in list: first: outer most, last: inner-most.
     """
 
-    def __init__(self, target):
+    def __init__(self, target, context=None):
         self._target = target
+        self._context = context
         self._wrappers = []
+        # Wrappers observing the items of generator results, inner-most first.
+        self._item_hooks = []
 
     def add(self, wrapper):
+        wrapper._next = self._wrappers[0] if self._wrappers else self._target
         self._wrappers.insert(0, wrapper)
+        if wrapper.observes_items():
+            self._item_hooks.append(wrapper)
 
     @property
     def target(self) -> Callable:
         return self._target
 
+    @property
+    def context(self):
+        return self._context
+
     def next(self, wrapper) -> Callable:
-        index = self._wrappers.index(wrapper)
-        if index == len(self._wrappers) - 1:
-            return self._target
-        return self._wrappers[index + 1]
+        return wrapper._next
+
+    def weave(self) -> Callable:
+        """
+        Returns the callable replacing the wrapped method: the chain itself, or a coroutine
+        function awaiting it when the chain is made of AsyncWrappers, so callers checking
+        for coroutine functions see one.
+        """
+        if not self._wrappers or not isinstance(self._wrappers[0], AsyncWrapper):
+            return self
+        outer_most = self._wrappers[0]
+
+        @functools.wraps(self._target)
+        async def woven(*args, **kwargs):
+            return await outer_most(*args, **kwargs)
+
+        woven.chain = self
+        return woven
 
     def __call__(self, *args, **kwargs):
-        return self._wrappers[0](*args, **kwargs)
+        result = self._wrappers[0](*args, **kwargs)
+        if self._item_hooks:
+            if inspect.isgenerator(result):
+                return self._stream(result)
+            if inspect.isasyncgen(result):
+                return self._stream_async(result)
+        return result
+
+    def _stream(self, items):
+        """
+        Passes the items of a generator through the item hooks as they are consumed.
+        """
+        hooks = self._item_hooks
+        count = 0
+        try:
+            for item in items:
+                for wrapper in hooks:
+                    item = wrapper.on_item(item)
+                count += 1
+                yield item
+        except Exception as e:
+            for wrapper in hooks:
+                wrapper.on_error(e)
+            raise
+        for wrapper in hooks:
+            wrapper.on_complete(count)
+
+    async def _stream_async(self, items):
+        hooks = self._item_hooks
+        count = 0
+        try:
+            async for item in items:
+                for wrapper in hooks:
+                    item = wrapper.on_item(item)
+                count += 1
+                yield item
+        except Exception as e:
+            for wrapper in hooks:
+                wrapper.on_error(e)
+            raise
+        for wrapper in hooks:
+            wrapper.on_complete(count)
 
     def __str__(self):
         return f"WrapperChain, target:{self._target}, wrappers:[{map(str,self._wrappers)}]"  # pragma: no cover
@@ -59,10 +131,16 @@ class Wrapper(metaclass=ABCMeta):
     Base class for method wrappers.
     All wrappers must implement __call__ method, the wrapper chaining is done by
     calling self.next(*args,**kwargs)
+
+    When the wrapped method returns a generator or an async generator, the chain
+    returns one which stays lazy and calls on_item for every item produced, then
+    on_complete, or on_error if the generator fails. Items go through the hooks
+    of the inner-most wrapper first.
     """
 
     def __init__(self, chain: WrapperChain):
         self._chain = chain
+        self._next = None
 
     @property
     def target(self) -> Callable:
@@ -71,13 +149,89 @@ class Wrapper(metaclass=ABCMeta):
         """
         return self._chain.target
 
+    @property
+    def context(self):
+        """
+        Returns the context which created the wrapped object.
+        """
+        return self._chain.context
+
     def next(self, *args, **kwargs):
         """
         Invokes the next wrapper in the chain, or the target method if it
         is at the end of the chain.
         """
-        return self._chain.next(self)(*args, **kwargs)
+        return self._next(*args, **kwargs)
 
     @abstractmethod
     def __call__(self, *args, **kwargs):
         pass  # pragma: no cover
+
+    def on_item(self, item):
+        """
+        Called for every item of a generator result, returns the item to pass on.
+        """
+        return item
+
+    def on_complete(self, count: int):
+        """
+        Called when a generator result is exhausted, with the number of items produced.
+        """
+
+    def on_error(self, error: Exception):
+        """
+        Called when a generator result raises an exception, which is raised again
+        after the hooks.
+        """
+
+    @classmethod
+    def observes_items(cls) -> bool:
+        return (
+            cls.on_item is not Wrapper.on_item
+            or cls.on_complete is not Wrapper.on_complete
+            or cls.on_error is not Wrapper.on_error
+        )
+
+
+class AsyncWrapper(Wrapper):
+    """
+    Base class for wrappers of coroutine methods. __call__ must be a coroutine
+    function, awaiting self.next(*args, **kwargs) runs the rest of the chain:
+
+        class TimingWrapper(pyoc.AsyncWrapper):
+            async def __call__(self, *args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await self.next(*args, **kwargs)
+                finally:
+                    logging.info(f"took {time.perf_counter() - start}")
+
+    A chain of AsyncWrappers can only wrap coroutine methods, and can't be mixed
+    with other wrappers, see check_chain.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not inspect.iscoroutinefunction(cls.__call__):
+            raise WrapperError(f"{cls.__name__}.__call__ must be a coroutine function")
+
+    @abstractmethod
+    async def __call__(self, *args, **kwargs):
+        pass  # pragma: no cover
+
+
+def check_chain(target, wrapper_types):
+    """
+    Raises WrapperError if the wrappers can't be chained around a method: async
+    wrappers need a coroutine method, and can't be mixed with sync wrappers, which
+    would only see the coroutines. Sync wrappers alone may wrap coroutine methods.
+    """
+    async_types = [t for t in wrapper_types if issubclass(t, AsyncWrapper)]
+    if not async_types:
+        return
+    name = getattr(target, "__qualname__", target)
+    if not inspect.iscoroutinefunction(target):
+        raise WrapperError(f"{async_types[0].__name__} can't wrap {name}, it is not a coroutine function")
+    if len(async_types) != len(wrapper_types):
+        sync_types = [t.__name__ for t in wrapper_types if t not in async_types]
+        raise WrapperError(f"{name} mixes async wrappers with sync wrappers {', '.join(sync_types)}")
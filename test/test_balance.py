@@ -0,0 +1,93 @@
+import asyncio
+import time
+import unittest
+import pyoc
+
+
+class Dao:
+    def get(self, id):
+        raise NotImplementedError()  # pragma: no cover
+
+
+class Replica1(Dao):
+    delay = 0.0
+    fail = False
+
+    def get(self, id):
+        if self.fail:
+            raise ConnectionError(self.__class__.__name__)
+        time.sleep(self.delay)
+        return f"{self.__class__.__name__} {id}"
+
+    async def get_async(self, id):
+        return self.get(id)
+
+
+class Replica2(Replica1):
+    pass
+
+
+class Service:
+    dao: pyoc.Balanced[Dao]
+
+
+class TestBalanced(unittest.TestCase):
+    def _context(self, **kwargs):
+        context = pyoc.Context().add(Replica1, singleton=True).add(Replica2, singleton=True).add(Service)
+        if kwargs:
+            context.set_balancing(Dao, **kwargs)
+        return context.build()
+
+    def test_round_robin(self):
+        context = self._context()
+        dao = context.get(Service).dao
+
+        self.assertEqual(["Replica1 1", "Replica2 2", "Replica1 3"], [dao.get(i) for i in (1, 2, 3)])
+        self.assertEqual("Replica2 4", asyncio.run(dao.get_async(4)))
+        self.assertEqual([2, 2], [stats["calls"] for stats in context.balancer(Dao).stats()])
+
+    def test_ejection(self):
+        context = self._context(max_failures=2, ejection_time=60)
+        context.get(Replica1).fail = True
+        dao = context.get_balanced(Dao)
+
+        for i in range(4):
+            try:
+                dao.get(i)
+            except ConnectionError:
+                pass
+        self.assertEqual(["Replica2 10", "Replica2 11"], [dao.get(10), dao.get(11)])
+        stats = context.balancer(Dao).stats()
+        self.assertTrue(stats[0]["ejected"])
+        self.assertEqual(2, stats[0]["errors"])
+
+    def test_ewma(self):
+        context = self._context(policy="ewma")
+        context.get(Replica1).delay = 0.01
+        dao = context.get_balanced(Dao)
+
+        results = [dao.get(i) for i in range(10)]
+        self.assertGreaterEqual(sum(result.startswith("Replica2") for result in results), 8)
+
+    def test_least_in_flight(self):
+        context = self._context(policy="least_in_flight")
+        balancer = context.balancer(Dao)
+        busy = balancer._acquire()
+
+        results = [context.get_balanced(Dao).get(i) for i in range(3)]
+        self.assertTrue(all(not result.startswith(busy.obj.__class__.__name__) for result in results))
+
+    def test_new_implementations(self):
+        class Replica3(Replica1):
+            pass
+
+        context = self._context()
+        dao = context.get_balanced(Dao)
+        dao.get(1)
+        context.add(Replica3).build()
+
+        self.assertEqual(3, len(context.balancer(Dao).stats()))
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            pyoc.Context().set_balancing(Dao, policy="random")
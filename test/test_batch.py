@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import unittest
+import pyoc
+
+
+class Dao:
+    def __init__(self):
+        self.batches = []
+
+    def get(self, id):
+        return self.get_many([id])[0]
+
+    def get_many(self, ids):
+        self.batches.append(list(ids))
+        return [f"user {id}" for id in ids]
+
+
+class AsyncDao(Dao):
+    async def get_many(self, ids):
+        self.batches.append(list(ids))
+        return {id: f"user {id}" for id in ids}
+
+
+class DaoBatchWrapper(pyoc.BatchWrapper):
+    batch_method = "get_many"
+    max_batch_size = 4
+    max_wait = 0.05
+
+
+class TestBatchWrapper(unittest.TestCase):
+    def _context(self, dao_type):
+        return pyoc.Context().add(dao_type, singleton=True).wrap(dao_type, "get$", DaoBatchWrapper).build()
+
+    def test_threads(self):
+        context = self._context(Dao)
+        dao = context.get(Dao)
+
+        results = {}
+
+        def load(id):
+            results[id] = dao.get(id)
+
+        threads = [threading.Thread(target=load, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({i: f"user {i}" for i in range(8)}, results)
+        self.assertLess(len(dao.batches), 8)
+        self.assertTrue(all(len(batch) <= 4 for batch in dao.batches))
+
+    def test_single_call(self):
+        context = self._context(Dao)
+        dao = context.get(Dao)
+
+        self.assertEqual("user 1", dao.get(1))
+        self.assertEqual([[1]], dao.batches)
+
+    def test_sync_in_event_loop(self):
+        context = self._context(Dao)
+        dao = context.get(Dao)
+
+        async def load():
+            return dao.get(1)
+
+        self.assertEqual("user 1", asyncio.run(load()))
+
+    def test_asyncio(self):
+        context = self._context(AsyncDao)
+        dao = context.get(AsyncDao)
+
+        async def load():
+            return await asyncio.gather(dao.get(1), dao.get(2), dao.get(2), dao.get(3))
+
+        self.assertEqual(["user 1", "user 2", "user 2", "user 3"], asyncio.run(load()))
+        self.assertEqual([[1, 2, 3]], dao.batches)
@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pyoc
+
+
+class Settings:
+    debug = pyoc.Value[bool]("app.debug", default=False)
+    name: str = pyoc.Value[str]("app.name")
+
+
+class Pool:
+    def __init__(self, size=pyoc.Value[int]("db.pool.size", default=4)):
+        self.size = size
+
+
+class Connection:
+    def __init__(self, path):
+        self.path = path
+
+
+class ConnectionFactory:
+    path = pyoc.Value[str]("db.path")
+
+    def __call__(self, *_):
+        return Connection(self.path)
+
+
+class CountingSource(pyoc.ConfigSource):
+    def __init__(self, values):
+        self.values = values
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        return dict(self.values)
+
+
+class TestConfig(unittest.TestCase):
+    def test_layers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = os.path.join(directory, "config.json")
+            with open(json_path, "w") as f:
+                json.dump({"app": {"name": "json", "debug": True}, "db": {"pool": {"size": 8}}}, f)
+            ini_path = os.path.join(directory, "config.ini")
+            with open(ini_path, "w") as f:
+                f.write("[db]\npath = ini.db\npool.size = 16\n")
+
+            with mock.patch.dict(os.environ, {"TEST_APP_DEBUG": "off"}):
+                context = (
+                    pyoc.Context()
+                    .add_config({"app": {"name": "dict"}, "db.path": "dict.db"})
+                    .add_config(json_path)
+                    .add_config(ini_path)
+                    .add_config(pyoc.EnvConfig("TEST_"))
+                    .add(Settings)
+                    .add(Pool)
+                    .add(Connection, factory=ConnectionFactory())
+                    .build()
+                )
+
+        settings = context.get(Settings)
+        self.assertEqual("json", settings.name)
+        self.assertIs(False, settings.debug)
+        self.assertEqual(16, context.get(Pool).size)
+        self.assertEqual("ini.db", context.get(Connection).path)
+
+    def test_parsed_once(self):
+        source = CountingSource({"app.name": "app", "app.debug": "yes"})
+        context = pyoc.Context().add_config(source).add(Settings).add(Pool).build()
+
+        settings = context.get(Settings)
+        for _ in range(3):
+            self.assertIs(True, settings.debug)
+        self.assertEqual(4, context.get(Pool).size)
+        self.assertEqual(1, source.loads)
+
+    def test_errors(self):
+        with self.assertRaises(pyoc.DependencyError):
+            pyoc.Context().add(Settings).build()
+        with self.assertRaises(pyoc.DependencyError):
+            pyoc.Context().add_config({"db.pool.size": "many"}).add(Pool).build()
+
+    def test_reload(self):
+        class Service:
+            def __init__(self, pool: Pool):
+                self.pool = pool
+
+        class Other:
+            pass
+
+        source = CountingSource({"db.pool.size": 2})
+        changes = []
+        context = (
+            pyoc.Context()
+            .add_config(source)
+            .add(Pool, singleton=True)
+            .add(Service, singleton=True)
+            .add(Other, singleton=True)
+            .on_config_change(changes.append)
+            .build()
+        )
+        service, other = context.get(Service), context.get(Other)
+
+        self.assertEqual(set(), context.reload_config())
+        source.values["db.pool.size"] = 3
+        self.assertEqual({"db.pool.size"}, context.reload_config())
+
+        self.assertEqual([{"db.pool.size"}], changes)
+        self.assertEqual(3, context.get(Service).pool.size)
+        self.assertIsNot(service, context.get(Service))
+        self.assertIs(other, context.get(Other))
@@ -1,6 +1,15 @@
+import asyncio
+import dataclasses
+import gc
+import inspect
+import json
+import operator
+import os
+import signal
+import time
 import unittest
 import pyoc
-from typing import List, Mapping
+from typing import Iterable, Iterator, List, Mapping
 
 
 class TestContext(unittest.TestCase):
@@ -77,7 +86,7 @@ class TestContext(unittest.TestCase):
 
         obj = context.get(Object2)
         self.assertIsNotNone(obj)
-        self.assertIsInstance(obj.object_1, dict)
+        self.assertIsInstance(obj.object_1, Mapping)
         self.assertIn("obj_1", obj.object_1)
         self.assertIsInstance(obj.object_1["obj_1"], Object1)
 
@@ -161,3 +170,762 @@ class TestContext(unittest.TestCase):
         obj = context.get(Obj)
 
         self.assertEqual(-2, obj.return_something())
+
+    def test_constructor_injection(self):
+        class Object1:
+            def do_something(self):
+                return "done"
+
+        class Object2:
+            def __init__(self, object_1: Object1, objects: List[Object1], count: int = 3):
+                self.object_1 = object_1
+                self.objects = objects
+                self.count = count
+
+        context = pyoc.Context().add(Object1).add(Object2).build()
+
+        obj = context.get(Object2)
+        self.assertIsInstance(obj.object_1, Object1)
+        self.assertIs(obj.object_1, obj.object_1)
+        self.assertEqual(1, len(obj.objects))
+        self.assertEqual(3, obj.count)
+        self.assertIs(object.__getattribute__, type(obj).__getattribute__)
+
+    def test_constructor_injection_by_name(self):
+        class Object1:
+            pass
+
+        class Object2:
+            def __init__(self, object_1=pyoc.ref("object_1")):
+                self.object_1 = object_1
+
+            def get_object_1(self):
+                return self.object_1
+
+        class MyWrapper(pyoc.Wrapper):
+            def __call__(self):
+                return self.next()
+
+        context = pyoc.Context().add(Object1, name="object_1").add(Object2).wrap(Object2, "get_.*", MyWrapper).build()
+
+        self.assertIsInstance(context.get(Object2).get_object_1(), Object1)
+        context.build()
+        self.assertIsInstance(context.get(Object2).object_1, Object1)
+
+    def test_constructor_injection_missing_dependency(self):
+        class Object1:
+            pass
+
+        class Object2:
+            def __init__(self, object_1: Object1):
+                self.object_1 = object_1
+
+        with self.assertRaises(pyoc.DependencyError):
+            pyoc.Context().add(Object2).build()
+
+        class Object3:
+            def __init__(self, object_1=pyoc.ref("missing")):
+                self.object_1 = object_1
+
+        with self.assertRaises(pyoc.DependencyError):
+            pyoc.Context().add(Object3).build()
+
+    def test_lazy_mapping(self):
+        created = []
+
+        class Plugin:
+            def __init__(self):
+                created.append(self)
+
+        class Plugin1(Plugin):
+            pass
+
+        class Plugin2(Plugin):
+            pass
+
+        class Registry:
+            plugins: Mapping[str, Plugin]
+
+        context = pyoc.Context().add(Plugin1, name="p1").add(Plugin2, name="p2").add(Registry).build()
+
+        plugins = context.get(Registry).plugins
+        self.assertEqual(["p1", "p2"], sorted(plugins))
+        self.assertEqual(0, len(created))
+        self.assertIs(plugins["p2"], plugins["p2"])
+        self.assertEqual(1, len(created))
+
+    def test_iterable_injection(self):
+        created = []
+
+        class Plugin:
+            def __init__(self):
+                created.append(self)
+
+        class Plugin1(Plugin):
+            pass
+
+        class Plugin2(Plugin):
+            pass
+
+        class Registry:
+            plugins: Iterable[Plugin]
+            plugin_iter: Iterator[Plugin]
+
+        context = pyoc.Context().add(Plugin1).add(Plugin2).add(Registry).build()
+
+        registry = context.get(Registry)
+        self.assertIsInstance(next(iter(registry.plugins)), Plugin1)
+        self.assertEqual(1, len(created))
+        self.assertEqual(2, len(list(registry.plugins)))
+        self.assertIsInstance(next(registry.plugin_iter), Plugin1)
+
+    def test_provider_injection(self):
+        class Handler:
+            pass
+
+        class Worker:
+            handlers: pyoc.Provider[Handler]
+
+        context = pyoc.Context().add(Handler).add(Worker).build()
+
+        provider = context.get(Worker).handlers
+        handler = provider.get()
+        self.assertIsInstance(handler, Handler)
+        handlers = provider.get_many(3)
+        self.assertEqual(3, len(handlers))
+        self.assertEqual(3, len(set(map(id, handlers))))
+        self.assertIsInstance(context.get_provider(Handler).get(), Handler)
+
+    def test_provider_singleton(self):
+        class Handler:
+            pass
+
+        context = pyoc.Context().add(Handler, singleton=True).build()
+
+        provider = context.get_provider(Handler)
+        self.assertIs(provider.get(), provider.get())
+
+    def test_tags_and_qualifiers(self):
+        class Repository:
+            pass
+
+        class UserRepository(Repository):
+            pass
+
+        class OrderRepository(Repository):
+            pass
+
+        context = (
+            pyoc.Context()
+            .add(UserRepository, tags=["repository"], qualifier="primary")
+            .add(OrderRepository, tags=["repository"], qualifier="secondary")
+            .build()
+        )
+
+        self.assertEqual(2, len(context.get_all_by_tag("repository")))
+        self.assertEqual([], context.get_all_by_tag("service"))
+        self.assertIsInstance(context.get(Repository, qualifier="secondary"), OrderRepository)
+        self.assertIsInstance(context.get(UserRepository, qualifier="primary"), UserRepository)
+        self.assertIsNone(context.get(UserRepository, qualifier="secondary"))
+
+    def test_get_by_expr_cache(self):
+        class Object1:
+            pass
+
+        class Object2:
+            pass
+
+        calls = []
+
+        def expr(obj_type):
+            calls.append(obj_type)
+            return obj_type.__name__ == "Object2"
+
+        context = pyoc.Context().add(Object1).build()
+
+        self.assertIsNone(context.get_by_expr(expr))
+        self.assertIsNone(context.get_by_expr(expr))
+        self.assertEqual(1, len(calls))
+
+        context.add(Object2).build()
+        self.assertIsInstance(context.get_by_expr(expr), Object2)
+
+        for _ in range(100):
+            context.get_by_expr(lambda obj_type: obj_type is Object1)
+        self.assertLessEqual(len(context._expr_cache), 2)
+        # Not weakly referenceable, found without caching.
+        self.assertIsInstance(context.get_by_expr(operator.attrgetter("__name__")), Object1)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_fork_unsafe_singletons(self):
+        class Connection:
+            pass
+
+        class Cache:
+            pass
+
+        context = pyoc.Context().add(Connection, singleton=True, fork_safe=False).add(Cache, singleton=True).build()
+
+        connection = context.get(Connection)
+        cache = context.get(Cache)
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            os.close(read_fd)
+            result = (context.get(Connection) is not connection) and (context.get(Cache) is cache)
+            os.write(write_fd, b"1" if result else b"0")
+            os._exit(0)
+
+        os.close(write_fd)
+        result = os.read(read_fd, 1)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(b"1", result)
+        self.assertIs(connection, context.get(Connection))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_fork_with_locks_held(self):
+        class Dao:
+            size = pyoc.Value[int]("size", default=1)
+
+            def get(self, id):
+                return self.get_many([id])[0]
+
+            def get_many(self, ids):
+                return [id * self.size for id in ids]
+
+        class Batch(pyoc.BatchWrapper):
+            batch_method = "get_many"
+            max_wait = 0
+
+        context = pyoc.Context().track_memory().add_config({"size": 2})
+        context.add(Dao).wrap(Dao, "get$", Batch).build()
+        self.assertEqual(2, context.get(Dao).get(1))
+
+        # Held by another thread of the parent process when it forks.
+        locks = [
+            pyoc.context._processed_types_lock,
+            pyoc.BatchWrapper._batchers_lock,
+            context._config._lock,
+            context._memory._lock,
+        ]
+        for lock in locks:
+            lock.acquire()
+        try:
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:  # pragma: no cover
+                os.close(read_fd)
+                # Fails instead of hanging if a lock is still held.
+                signal.alarm(5)
+                context.add(Dao, name="other").build()
+                result = context.get("other").get(2) == 4 and context.reload_config() == set()
+                os.write(write_fd, b"1" if result else b"0")
+                os._exit(0)
+        finally:
+            for lock in locks:
+                lock.release()
+
+        os.close(write_fd)
+        result = os.read(read_fd, 1)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(b"1", result)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_fork_unsafe_dependents(self):
+        class Connection:
+            def query(self):
+                return self
+
+        class Dao:
+            def __init__(self, connection: Connection):
+                self.connection = connection
+
+        class Resource:
+            dao: Dao
+            connections: Mapping[str, Connection]
+
+        context = (
+            pyoc.Context()
+            .add(Connection, name="main", singleton=True, fork_safe=False)
+            .add(Dao, singleton=True)
+            .add(Resource)
+            .build()
+        )
+        dao = context.get(Dao)
+        resource = context.wire(context.new(Resource))
+        self.assertIs(dao.connection, resource.connections["main"])
+        balanced = context.get_balanced(Connection)
+        self.assertIs(dao.connection, balanced.query())
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            os.close(read_fd)
+            child_dao = context.get(Dao)
+            result = (
+                child_dao is not dao
+                and child_dao.connection is not dao.connection
+                and child_dao.connection is context.get(Connection)
+                and resource.dao is child_dao
+                and resource.connections["main"] is child_dao.connection
+                and balanced.query() is child_dao.connection
+            )
+            os.write(write_fd, b"1" if result else b"0")
+            os._exit(0)
+
+        os.close(write_fd)
+        result = os.read(read_fd, 1)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(b"1", result)
+        self.assertIs(dao, context.get(Dao))
+        self.assertIs(dao, resource.dao)
+
+    def test_warm_up(self):
+        created = []
+
+        class Object1:
+            def __init__(self):
+                created.append(self)
+
+        pyoc.Context().add(Object1, singleton=True, lazy=False).build()
+        self.assertEqual(1, len(created))
+
+    def test_startup_report(self):
+        class Database:
+            def __init__(self):
+                time.sleep(0.02)
+
+        class Cache:
+            def __init__(self):
+                time.sleep(0.005)
+
+        class Service:
+            _cache: Cache
+
+            def __init__(self, database: Database):
+                self.database = database
+
+        context = (
+            pyoc.Context().add(Database).add(Cache).add(Service, singleton=True, lazy=False).build()
+        )
+        context.get(Service)._cache
+
+        report = context.startup_report()
+        names = [record.name.rsplit(".", 1)[-1] for record in report.critical_path()]
+        self.assertEqual(["Service", "Database"], names)
+
+        data = json.loads(report.to_json())
+        service = next(c for c in data["components"] if c["name"].endswith("Service"))
+        self.assertEqual(2, len(service["dependencies"]))
+        self.assertIn("* ", report.to_text())
+
+    def test_mock_members(self):
+        from unittest.mock import MagicMock
+
+        class Object1:
+            helper = MagicMock()
+
+        context = pyoc.Context().add(Object1).build()
+
+        self.assertIsInstance(context.get(Object1).helper, MagicMock)
+
+    def test_incremental_build(self):
+        processed = []
+
+        class Object1:
+            pass
+
+        class Object2:
+            pass
+
+        context = pyoc.Context().add(Object1).build()
+        process_type = context._process_type
+        context._process_type = lambda t: processed.append(t) or process_type(t)
+
+        context.add(Object2).build()
+
+        self.assertEqual([Object2], processed)
+        self.assertIsInstance(context.get(Object1), Object1)
+        self.assertIsInstance(context.get(Object2), Object2)
+
+    def test_remove(self):
+        released = []
+
+        class Database:
+            def release(self):
+                released.append(self)
+
+        class Service:
+            def __init__(self, database: Database):
+                self.database = database
+
+            def release(self):
+                released.append(self)
+
+        class Other:
+            def release(self):
+                released.append(self)
+
+        context = (
+            pyoc.Context()
+            .add(Database, singleton=True, tags=["db"])
+            .add(Service, singleton=True)
+            .add(Other, singleton=True)
+            .build()
+        )
+        service = context.get(Service)
+        context.get(Other)
+
+        context.remove(Database)
+
+        self.assertIsNone(context.get(Database))
+        self.assertEqual([], context.get_all_by_tag("db"))
+        self.assertEqual(2, len(released))
+        self.assertIn(service, released)
+
+        with self.assertRaises(pyoc.DependencyError):
+            context.get(Service)
+
+    def test_remove_before_build(self):
+        class Object1:
+            pass
+
+        context = pyoc.Context().add(Object1, tags=["t"])
+        context.remove(Object1)
+
+        self.assertIsNone(context.build().get(Object1))
+        self.assertEqual([], context.get_all_by_tag("t"))
+
+    def test_replace(self):
+        class Dao:
+            pass
+
+        class SQLDao(Dao):
+            pass
+
+        class MemoryDao(Dao):
+            pass
+
+        class Service:
+            def __init__(self, dao: Dao):
+                self.dao = dao
+
+        context = pyoc.Context().add(SQLDao, name="dao").add(Service, singleton=True).build()
+        self.assertIsInstance(context.get(Service).dao, SQLDao)
+
+        context.replace("dao", MemoryDao)
+
+        self.assertIsInstance(context.get("dao"), MemoryDao)
+        self.assertIsInstance(context.get(Service).dao, MemoryDao)
+
+        context.replace(Dao, SQLDao)
+
+        self.assertEqual(1, len(context.get_all_by_type(Dao)))
+        self.assertIsInstance(context.get(Dao), SQLDao)
+        self.assertIsInstance(context.get(Service).dao, SQLDao)
+
+        with self.assertRaises(pyoc.DependencyError):
+            context.replace("missing", SQLDao)
+
+    def test_shared_processed_types(self):
+        class Config:
+            pass
+
+        class Service:
+            config: Config
+
+        contexts = [pyoc.Context().add_object(Config()).add(Service).build() for _ in range(3)]
+
+        services = [context.get(Service) for context in contexts]
+        self.assertEqual(1, len({type(service) for service in services}))
+        for context, service in zip(contexts, services):
+            self.assertIs(context.get(Config), service.config)
+
+        bound_type = contexts[0].process(Service)
+        self.assertIs(contexts[0].get(Config), bound_type().config)
+        self.assertIs(bound_type, contexts[0].process(Service))
+
+    def test_wrapper_per_instance(self):
+        class Obj:
+            def __init__(self):
+                self.value = len(instances)
+                instances.append(self)
+
+            def return_value(self):
+                return self.value
+
+        class MyWrapper(pyoc.Wrapper):
+            def __call__(self):
+                return self.next() + 10
+
+        instances = []
+        context = pyoc.Context().add(Obj).wrap(Obj, "return_value", MyWrapper).build()
+
+        self.assertEqual(10, context.get(Obj).return_value())
+        self.assertEqual(11, context.get(Obj).return_value())
+
+    def test_wire(self):
+        class Dep:
+            pass
+
+        class Obj:
+            dep: Dep
+            other = pyoc.ref(Dep)
+
+        context = pyoc.Context().add(Dep).add(Obj).build()
+        obj = context.wire(context.get(Obj))
+
+        self.assertIsInstance(obj.dep, Dep)
+        self.assertIs(obj.dep, obj.dep)
+        self.assertIs(obj.other, obj.other)
+        self.assertIsNot(obj.dep, obj.other)
+
+    def test_wire_slots(self):
+        class Dep:
+            pass
+
+        class Compact:
+            __slots__ = ("value",)
+            dep: Dep
+
+        context = pyoc.Context().add(Dep).add(Compact).build()
+        for _ in range(10):
+            obj = context.wire(context.get(Compact))
+            self.assertIsInstance(obj.dep, Dep)
+        del obj
+        gc.collect()
+
+        self.assertEqual([], [obj for obj in gc.get_objects() if isinstance(obj, Compact)])
+
+    def test_build_roots(self):
+        created = []
+
+        class Part:
+            def __init__(self):
+                created.append(Part)
+
+        class Store:
+            parts: List[Part]
+
+        class Audit:
+            pass
+
+        class AuditWrapper(pyoc.Wrapper):
+            audit: Audit
+
+            def __call__(self, *args, **kwargs):
+                return self.next(*args, **kwargs)
+
+        class Service:
+            def __init__(self, store: Store):
+                self.store = store
+
+            def run(self):
+                return len(self.store.parts)
+
+        class Unused:
+            def __init__(self):
+                created.append(Unused)
+
+        context = (
+            pyoc.Context()
+            .add(Part, lazy=False, singleton=True)
+            .add(Store)
+            .add(Audit)
+            .add(Service)
+            .add(Unused, lazy=False, singleton=True)
+            .wrap(Service, "run", AuditWrapper)
+            .build(roots=[Service])
+        )
+
+        self.assertEqual([Part], created)
+        self.assertEqual(1, context.get(Service).run())
+        self.assertIsNone(context.get(Unused))
+        report = context.startup_report()
+        self.assertEqual(1, len(report.pruned))
+        self.assertTrue(report.pruned[0].endswith("Unused"))
+        self.assertIn("pruned:", report.to_text())
+
+        context.build()
+        self.assertEqual([Part, Unused], created)
+        self.assertEqual([], context.startup_report().pruned)
+
+    def test_memory_report(self):
+        class Config:
+            pass
+
+        class Request:
+            def __init__(self):
+                self.payload = list(range(100))
+
+        context = pyoc.Context().track_memory(sample_every=1)
+        context.add(Config, singleton=True).add(Request).build()
+
+        context.get(Config)
+        kept = [context.get(Request) for _ in range(3)]
+        before = context.memory_report()
+        self.assertEqual(1, before.get("Config", "singleton").live)
+        request = before.get("Request")
+        self.assertEqual(3, request.live)
+        self.assertEqual(3, request.peak)
+        self.assertGreater(request.estimated_size, 0)
+
+        kept.pop()
+        kept.append(context.get(Request))
+        kept.append(context.get(Request))
+        diff = context.memory_report().diff(before)
+        self.assertEqual(1, len(diff.entries))
+        self.assertEqual(1, diff.get("Request").live)
+        self.assertEqual(2, diff.get("Request").created)
+        self.assertEqual(4, diff.get("Request").peak)
+
+        del kept
+        self.assertEqual(0, context.memory_report().get("Request").live)
+
+        # Providers created before tracking was enabled.
+        context = pyoc.Context().add(Request).build()
+        provider = context.get_provider(Request)
+        context.track_memory()
+        kept = provider.get_many(2)
+        self.assertEqual(2, context.memory_report().get("Request").live)
+
+    def test_wrapper_stream(self):
+        events = []
+
+        class Obj:
+            def numbers(self, count):
+                for i in range(count):
+                    events.append(f"produce {i}")
+                    yield i
+
+            def failing(self):
+                yield 1
+                raise ValueError("failed")
+
+            async def numbers_async(self, count):
+                for i in range(count):
+                    yield i
+
+        class Double(pyoc.Wrapper):
+            def __call__(self, *args, **kwargs):
+                return self.next(*args, **kwargs)
+
+            def on_item(self, item):
+                return item * 2
+
+        class Log(pyoc.Wrapper):
+            def __call__(self, *args, **kwargs):
+                return self.next(*args, **kwargs)
+
+            def on_item(self, item):
+                events.append(f"item {item}")
+                return item
+
+            def on_complete(self, count):
+                events.append(f"complete {count}")
+
+            def on_error(self, error):
+                events.append(f"error {error}")
+
+        context = pyoc.Context().add(Obj).wrap(Obj, ".*", Double).wrap(Obj, ".*", Log).build()
+        obj = context.get(Obj)
+
+        numbers = obj.numbers(2)
+        self.assertEqual([], events)
+        self.assertEqual([0, 2], list(numbers))
+        self.assertEqual(["produce 0", "item 0", "produce 1", "item 2", "complete 2"], events)
+
+        events.clear()
+        with self.assertRaises(ValueError):
+            list(obj.failing())
+        self.assertEqual(["item 2", "error failed"], events)
+
+        async def consume():
+            return [i async for i in obj.numbers_async(3)]
+
+        events.clear()
+        self.assertEqual([0, 2, 4], asyncio.run(consume()))
+        self.assertEqual("complete 3", events[-1])
+
+    def test_async_wrapper(self):
+        class Obj:
+            async def value(self, x):
+                await asyncio.sleep(0)
+                return x
+
+            def sync_value(self, x):
+                return x
+
+        class Add(pyoc.AsyncWrapper):
+            async def __call__(self, *args, **kwargs):
+                return await self.next(*args, **kwargs) + 1
+
+        class Times(pyoc.AsyncWrapper):
+            async def __call__(self, *args, **kwargs):
+                return await self.next(*args, **kwargs) * 10
+
+        context = pyoc.Context().add(Obj).wrap(Obj, "value", Add).wrap(Obj, "value", Times).build()
+        # Times is the outer-most.
+        obj = context.get(Obj)
+        self.assertEqual(20, asyncio.run(obj.value(1)))
+        self.assertTrue(inspect.iscoroutinefunction(obj.value))
+        self.assertTrue(asyncio.iscoroutinefunction(obj.value))
+        self.assertIs(obj.value, obj.value)
+
+        with self.assertRaises(pyoc.WrapperError):
+            pyoc.Context().add(Obj).wrap(Obj, "sync_value", Add).build()
+
+        class Log(pyoc.Wrapper):
+            def __call__(self, *args, **kwargs):
+                return self.next(*args, **kwargs)
+
+        with self.assertRaises(pyoc.WrapperError):
+            pyoc.Context().add(Obj).wrap(Obj, "value", Add).wrap(Obj, "value", Log).build()
+
+        # Sync wrappers alone receive the coroutine.
+        context = pyoc.Context().add(Obj).wrap(Obj, "value", Log).build()
+        self.assertEqual(1, asyncio.run(context.get(Obj).value(1)))
+
+        with self.assertRaises(pyoc.WrapperError):
+
+            class NotAsync(pyoc.AsyncWrapper):
+                def __call__(self, *args, **kwargs):
+                    pass
+
+    def test_slots(self):
+        class Dep:
+            pass
+
+        class Compact:
+            __slots__ = ("dep", "value")
+            dep: Dep
+
+            def __init__(self, value=1):
+                self.value = value
+
+            def get_dep(self):
+                return self.dep
+
+        @dataclasses.dataclass(slots=True)
+        class CompactData:
+            dep: Dep = None
+
+        class Log(pyoc.Wrapper):
+            def __call__(self, *args, **kwargs):
+                return self.next(*args, **kwargs)
+
+        context = pyoc.Context().add(Dep).add(Compact).add(CompactData).wrap(Compact, "get_dep", Log).build()
+
+        for obj in (context.get(Compact), context.get(CompactData), context.process(Compact)(2)):
+            self.assertFalse(hasattr(obj, "__dict__"))
+            self.assertIsInstance(obj.dep, Dep)
+        compact = context.get(Compact)
+        self.assertIs(compact.dep, compact.get_dep())
+        self.assertEqual(2, context.process(Compact)(2).value)
@@ -32,3 +32,79 @@ class TestFlaskBlueprint(unittest.TestCase):
         res = client.get("/sample")
 
         self.assertEqual(b'"hello world"\n', res.data)
+
+    def test_blueprint_pool(self):
+        created = []
+
+        class Service:
+            def do_something(self, name):
+                return f"hello {name}"
+
+        class SampleResource(Resource):
+
+            _service: Service
+
+            def __init__(self, suffix=""):
+                self.suffix = suffix
+                created.append(self)
+
+            def get(self, name):
+                return self._service.do_something(name) + self.suffix, 200
+
+            def post(self, name):
+                raise ValueError(name)
+
+        ctx = pyoc.Context()
+        ctx.add(Service)
+        ctx.build()
+
+        bp = pyoc.flask.BluePrint("main", __name__, "/", ctx)
+        bp.add_endpoint(
+            SampleResource, "/sample/<name>", endpoint="sample", pool_size=2, resource_class_kwargs={"suffix": "!"}
+        )
+
+        app = Flask(__name__)
+        app.register_blueprint(bp)
+        client = app.test_client()
+
+        self.assertEqual(b'"hello a!"\n', client.get("/sample/a").data)
+        self.assertEqual(b'"hello b!"\n', client.get("/sample/b").data)
+        self.assertEqual(500, client.post("/sample/c").status_code)
+
+        self.assertEqual(2, len(created))
+        # Services are resolved once, when the instances are created.
+        self.assertIs(created[0]._service, created[0]._service)
+        stats = bp.endpoint_stats["sample"]
+        self.assertEqual(3, stats.requests)
+        self.assertEqual(1, stats.errors)
+        self.assertEqual(0, stats.in_flight)
+
+    def test_blueprint_stream(self):
+        class Service:
+            def find_all(self, count):
+                for i in range(count):
+                    yield {"id": i}
+
+        class SampleResource(Resource):
+
+            _service: Service
+
+            def get(self, count):
+                return self._service.find_all(count)
+
+        ctx = pyoc.Context()
+        ctx.add(Service)
+        ctx.build()
+
+        bp = pyoc.flask.BluePrint("main", __name__, "/", ctx)
+        bp.add_endpoint(SampleResource, "/sample/<int:count>", methods=["GET"])
+
+        app = Flask(__name__)
+        app.register_blueprint(bp)
+        client = app.test_client()
+
+        res = client.get("/sample/3")
+        self.assertTrue(res.is_streamed)
+        self.assertEqual("application/json", res.mimetype)
+        self.assertEqual([{"id": 0}, {"id": 1}, {"id": 2}], res.json)
+        self.assertEqual([], client.get("/sample/0").json)
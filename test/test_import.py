@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# Cumulative microseconds reported by "python -X importtime" for the pyoc package.
+IMPORT_TIME_BUDGET = 150000
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestImport(unittest.TestCase):
+    def _run(self, *args):
+        return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True)
+
+    def test_import_time(self):
+        # Warm up the bytecode cache.
+        self._run("-c", "import pyoc")
+
+        result = self._run("-X", "importtime", "-c", "import pyoc")
+
+        cumulative = next(
+            int(line.split("|")[1]) for line in result.stderr.splitlines() if line.split("|")[-1].strip() == "pyoc"
+        )
+        self.assertLess(cumulative, IMPORT_TIME_BUDGET)
+
+    def test_no_eager_imports(self):
+        result = self._run(
+            "-c",
+            "import sys, pyoc; print(' '.join(m for m in ('flask', 'flask_restful', 'mock', 'asyncio', "
+            "'multiprocessing') if m in sys.modules))",
+        )
+        self.assertEqual("", result.stdout.strip())
+
+    def test_lazy_members(self):
+        result = self._run("-c", "import pyoc; print(pyoc.flask.BluePrint.__name__, pyoc.BatchWrapper.__name__)")
+        self.assertEqual("BluePrint BatchWrapper", result.stdout.strip())
@@ -0,0 +1,45 @@
+import asyncio
+import contextvars
+import threading
+import unittest
+import pyoc
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+class Service:
+    def fetch(self, value):
+        return value, request_id.get(), threading.current_thread().name
+
+
+class TestOffloadWrapper(unittest.TestCase):
+    def setUp(self):
+        self.context = pyoc.Context(max_workers=2).add(Service).wrap(Service, "fetch", pyoc.OffloadWrapper).build()
+
+    def tearDown(self):
+        self.context.close()
+
+    def test_future(self):
+        request_id.set("req-1")
+        future = self.context.get(Service).fetch(1)
+
+        value, current_request_id, thread_name = future.result()
+        self.assertEqual(1, value)
+        self.assertEqual("req-1", current_request_id)
+        self.assertTrue(thread_name.startswith("pyoc"))
+
+    def test_awaitable(self):
+        service = self.context.get(Service)
+
+        async def fetch():
+            return await asyncio.gather(service.fetch(1), service.fetch(2))
+
+        results = asyncio.run(fetch())
+        self.assertEqual([1, 2], [value for value, _, _ in results])
+
+    def test_close(self):
+        self.context.get(Service).fetch(1).result()
+        executor = self.context.executor
+        self.context.close()
+        with self.assertRaises(RuntimeError):
+            executor.submit(print)
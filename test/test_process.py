@@ -0,0 +1,42 @@
+import os
+import unittest
+import pyoc
+
+
+class HashService:
+    def checksum(self, value):
+        return sum(value.encode()), os.getpid()
+
+    def reverse(self, buffer):
+        return pyoc.SharedBuffer.from_bytes(bytes(buffer.buf[::-1]))
+
+
+def build_context():
+    return pyoc.Context().add(HashService).wrap(HashService, "checksum|reverse", pyoc.ProcessWrapper).build()
+
+
+class TestProcessWrapper(unittest.TestCase):
+    def setUp(self):
+        self.context = build_context().set_process_pool(build_context, max_workers=2)
+
+    def tearDown(self):
+        self.context.close()
+
+    def test_wrapper(self):
+        result, pid = self.context.get(HashService).checksum("abc").result()
+        self.assertEqual(sum(b"abc"), result)
+        self.assertNotEqual(os.getpid(), pid)
+
+    def test_map(self):
+        values = [str(i) for i in range(10)]
+        results = self.context.process_dispatcher.map(HashService, "checksum", values, chunksize=3)
+        self.assertEqual([sum(v.encode()) for v in values], [result for result, _ in results])
+
+    def test_shared_buffer(self):
+        with pyoc.SharedBuffer.from_bytes(b"hello") as buffer:
+            with self.context.get(HashService).reverse(buffer).result() as result:
+                self.assertEqual(b"olleh", result.tobytes())
+
+    def test_no_process_pool(self):
+        with self.assertRaises(RuntimeError):
+            build_context().get(HashService).checksum("abc")